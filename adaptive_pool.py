@@ -0,0 +1,191 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class AdaptiveThreadPoolExecutor:
+    """Thread pool that grows and shrinks between min_workers and max_workers.
+
+    A monitor thread samples queue depth, worker utilisation and completed
+    tasks per second every `interval` seconds.  A resize only happens after
+    the same decision has been seen for `grow_after` / `shrink_after`
+    consecutive samples, and never within `cooldown` seconds of the previous
+    resize, so the pool doesn't thrash.
+    """
+
+    def __init__(self, min_workers=2, max_workers=50, interval=1.0,
+                 grow_after=2, shrink_after=5, cooldown=3.0,
+                 grow_step=2, shrink_step=1, high_util=0.9, low_util=0.3):
+        if min_workers < 1 or max_workers < min_workers:
+            raise ValueError("need 1 <= min_workers <= max_workers")
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.grow_after = grow_after
+        self.shrink_after = shrink_after
+        self.cooldown = cooldown
+        self.grow_step = grow_step
+        self.shrink_step = shrink_step
+        self.high_util = high_util
+        self.low_util = low_util
+
+        self._work_queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._busy = 0
+        self._completed = 0
+        self._retire = 0
+        self._shutdown = False
+        self._next_id = 0
+
+        self._grow_votes = 0
+        self._shrink_votes = 0
+        self._last_resize = 0.0
+        self._last_grow_throughput = None
+        self.resize_log = []
+
+        for _ in range(min_workers):
+            self._spawn_worker()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="pool-monitor", daemon=True)
+        self._monitor.start()
+
+    @property
+    def size(self):
+        with self._lock:
+            return len(self._workers)
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+        self._work_queue.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._shutdown = True
+            workers = list(self._workers)
+        for _ in workers:
+            self._work_queue.put(None)
+        if wait:
+            for t in workers:
+                t.join()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                workers=len(self._workers),
+                busy=self._busy,
+                queued=self._work_queue.qsize(),
+                completed=self._completed,
+            )
+
+    def _spawn_worker(self):
+        self._next_id += 1
+        t = threading.Thread(target=self._worker_loop, name=f"adaptive-worker-{self._next_id}", daemon=True)
+        self._workers.add(t)
+        t.start()
+
+    def _worker_loop(self):
+        me = threading.current_thread()
+        while True:
+            try:
+                item = self._work_queue.get(timeout=self.interval)
+            except queue.Empty:
+                if self._should_retire(me):
+                    return
+                continue
+            if item is None:
+                with self._lock:
+                    self._workers.discard(me)
+                return
+
+            future, fn, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._busy += 1
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    with self._lock:
+                        self._busy -= 1
+                        self._completed += 1
+            if self._should_retire(me):
+                return
+
+    def _should_retire(self, me):
+        with self._lock:
+            if self._retire > 0 and len(self._workers) > self.min_workers:
+                self._retire -= 1
+                self._workers.discard(me)
+                return True
+        return False
+
+    def _monitor_loop(self):
+        last_completed = 0
+        last_time = time.time()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._shutdown:
+                    return
+                workers = len(self._workers)
+                busy = self._busy
+                completed = self._completed
+            queued = self._work_queue.qsize()
+            now = time.time()
+            throughput = (completed - last_completed) / (now - last_time)
+            last_completed, last_time = completed, now
+            utilisation = busy / workers if workers else 1.0
+            self._decide(workers, busy, queued, utilisation, throughput, now)
+
+    def _decide(self, workers, busy, queued, utilisation, throughput, now):
+        want_grow = queued > 0 and utilisation >= self.high_util and workers < self.max_workers
+        want_shrink = queued == 0 and utilisation <= self.low_util and workers > self.min_workers
+        if queued == 0:
+            self._last_grow_throughput = None
+
+        # the last grow did not raise throughput, hold off until it does. Only
+        # when both samples saw completions: with every worker stuck in a long
+        # transfer throughput reads 0 and says nothing about the extra workers
+        if (want_grow and self._last_grow_throughput and throughput > 0
+                and throughput <= self._last_grow_throughput):
+            want_grow = False
+
+        self._grow_votes = self._grow_votes + 1 if want_grow else 0
+        self._shrink_votes = self._shrink_votes + 1 if want_shrink else 0
+
+        if now - self._last_resize < self.cooldown:
+            return
+        if self._grow_votes >= self.grow_after:
+            target = min(self.max_workers, workers + self.grow_step)
+            self._resize("grow", workers, target, busy, queued, utilisation, throughput, now)
+            self._last_grow_throughput = throughput
+        elif self._shrink_votes >= self.shrink_after:
+            target = max(self.min_workers, workers - self.shrink_step)
+            self._resize("shrink", workers, target, busy, queued, utilisation, throughput, now)
+            self._last_grow_throughput = None
+
+    def _resize(self, action, old, new, busy, queued, utilisation, throughput, now):
+        with self._lock:
+            if action == "grow":
+                for _ in range(new - old):
+                    self._spawn_worker()
+            else:
+                self._retire += old - new
+        self._grow_votes = self._shrink_votes = 0
+        self._last_resize = now
+        entry = dict(
+            time=now, action=action, old_size=old, new_size=new, busy=busy,
+            queued=queued, utilisation=round(utilisation, 2), throughput=round(throughput, 2),
+        )
+        self.resize_log.append(entry)
+        logging.warning(
+            f"pool resize {action}: {old} -> {new} workers "
+            f"(busy={busy}, queued={queued}, util={utilisation:.2f}, throughput={throughput:.2f} req/s)"
+        )
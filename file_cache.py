@@ -0,0 +1,128 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+class DownloadCache:
+    """
+    On-disk cache of downloaded files, keyed by remote filename.
+
+    Each entry remembers the server's etag so the client can send
+    GETIF <namafile> <etag> and skip the body when the file is unchanged.
+    Entries are evicted least-recently-used first once the total size
+    exceeds max_bytes.
+
+    Several processes may share one directory: every change re-reads
+    index.json under an flock on index.lock and is applied on top of it.
+    """
+
+    def __init__(self, directory=".filecache", max_bytes=1024 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.lock_path = os.path.join(self.directory, "index.lock")
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.entries = OrderedDict()
+        self._load()
+
+    def blob_path(self, filename):
+        return os.path.join(self.directory, hashlib.md5(filename.encode()).hexdigest())
+
+    @contextmanager
+    def locked(self):
+        """Hold this thread's lock and the directory's flock, with the index freshly loaded"""
+        with self.lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def etag(self, filename):
+        """The cached etag for filename, or None if it isn't cached"""
+        with self.locked():
+            entry = self.entries.get(filename)
+            if entry is None:
+                return None
+            if not os.path.exists(self.blob_path(filename)):
+                del self.entries[filename]
+                return None
+            return entry["etag"]
+
+    def store(self, filename, etag, local_path):
+        """Remember a freshly downloaded file that was written to local_path"""
+        size = os.path.getsize(local_path)
+        if size > self.max_bytes:
+            return False
+        blob = self.blob_path(filename)
+        tmp = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(local_path, tmp)
+        with self.locked():
+            os.replace(tmp, blob)
+            self.entries[filename] = dict(
+                etag=etag, size=size, local=os.path.abspath(local_path),
+                local_mtime=os.stat(local_path).st_mtime_ns,
+            )
+            self.entries.move_to_end(filename)
+            self._evict()
+            self._save()
+        return True
+
+    def restore(self, filename, local_path):
+        """
+        Make local_path hold the cached copy after a NOT_MODIFIED answer.
+        Nothing is written if local_path is still the file this cache last produced.
+        Returns the file size, or None if the entry was evicted meanwhile.
+        """
+        local_path = os.path.abspath(local_path)
+        with self.locked():
+            entry = self.entries.get(filename)
+            if entry is None or not os.path.exists(self.blob_path(filename)):
+                return None
+            self.entries.move_to_end(filename)
+            try:
+                st = os.stat(local_path)
+                untouched = (
+                    entry["local"] == local_path
+                    and st.st_size == entry["size"]
+                    and st.st_mtime_ns == entry["local_mtime"]
+                )
+            except OSError:
+                untouched = False
+            if not untouched:
+                shutil.copyfile(self.blob_path(filename), local_path)
+                entry["local"] = local_path
+                entry["local_mtime"] = os.stat(local_path).st_mtime_ns
+            self._save()
+            return entry["size"]
+
+    def _load(self):
+        # another process may have stored or evicted entries since we last looked
+        try:
+            with open(self.index_path) as f:
+                self.entries = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def _evict(self):
+        total = sum(e["size"] for e in self.entries.values())
+        while total > self.max_bytes and self.entries:
+            filename, entry = self.entries.popitem(last=False)
+            total -= entry["size"]
+            try:
+                os.remove(self.blob_path(filename))
+            except OSError:
+                pass
+
+    def _save(self):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.index_path)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import base64
+import logging
+import os
+import time
+import argparse
+import itertools
+from socket_config import SocketConfig
+from tracing import tracer
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class FileClient:
+    """asyncio version of FileClient; every remote_* method is a coroutine"""
+
+    def __init__(self, server_ip, server_port, sock_config=None):
+        self.server_address = (server_ip, server_port)
+        self.timeout = 300  # 5 minutes timeout for large files
+        self.sock_config = sock_config or SocketConfig.from_env()
+        self.task_ids = itertools.count(1)
+
+    def request(self, command, **args):
+        # every request shares the loop thread, so each gets its own trace row
+        task_id = next(self.task_ids)
+        return tracer.request(command, tid=task_id, worker=f"task-{task_id}", **args)
+
+    async def send_command(self, command_str):
+        writer = None
+        try:
+            command_str = tracer.frame(command_str)
+            with tracer.span("connect"):
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(*self.server_address), self.timeout
+                )
+            self.sock_config.apply(writer.get_extra_info("socket"))
+            with tracer.span("send"):
+                writer.write((command_str + "\r\n\r\n").encode())
+                await writer.drain()
+
+            data_received = bytearray()
+            with tracer.span("recv"):
+                while True:
+                    data = await asyncio.wait_for(reader.read(self.sock_config.recv_size), self.timeout)
+                    if not data:
+                        break
+                    # only look at the tail so large responses aren't rescanned
+                    start = max(0, len(data_received) - 3)
+                    data_received += data
+                    if data_received.find(b"\r\n\r\n", start) >= 0:
+                        break
+
+            json_response = data_received.split(b"\r\n\r\n")[0]
+            with tracer.span("json"):
+                return json.loads(json_response)
+        except Exception as e:
+            return {"status": "ERROR", "data": str(e)}
+        finally:
+            if writer is not None:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+
+    async def remote_list(self):
+        with self.request("LIST"):
+            result = await self.send_command("LIST")
+        if result["status"] == "OK":
+            return True, result["data"]
+        return False, result.get("data", "Unknown error")
+
+    async def remote_get(self, filename):
+        with self.request("GET", file=filename):
+            return await self._remote_get(filename)
+
+    async def _remote_get(self, filename):
+        start_time = time.time()
+        result = await self.send_command(f"GET {filename}")
+        if result["status"] == "OK":
+            try:
+                namafile = result["data_namafile"]
+                # decode/write off the event loop so other connections keep moving
+                await asyncio.to_thread(self._write_file, namafile, result["data_file"])
+                elapsed = time.time() - start_time
+                return True, elapsed, os.path.getsize(namafile)
+            except Exception as e:
+                return False, 0, 0
+        return False, 0, 0
+
+    async def remote_upload(self, filename):
+        with self.request("UPLOAD", file=filename):
+            return await self._remote_upload(filename)
+
+    async def _remote_upload(self, filename):
+        start_time = time.time()
+        if not os.path.exists(filename):
+            return False, 0, 0
+
+        try:
+            file_size = os.path.getsize(filename)
+            encoded = await asyncio.to_thread(self._read_file, filename)
+
+            result = await self.send_command(f"UPLOAD {filename} {encoded}")
+            elapsed = time.time() - start_time
+
+            if result and result.get("status") == "OK":
+                return True, elapsed, file_size
+            return False, 0, 0
+        except Exception as e:
+            return False, 0, 0
+
+    @staticmethod
+    def _write_file(namafile, data_file):
+        with tracer.span("decode"):
+            raw = base64.b64decode(data_file)
+        with tracer.span("write"), open(namafile, "wb+") as fp:
+            fp.write(raw)
+
+    @staticmethod
+    def _read_file(filename):
+        with open(filename, "rb") as fp:
+            with tracer.span("read"):
+                raw = fp.read()
+        with tracer.span("encode"):
+            return base64.b64encode(raw).decode()
+
+
+def raise_fd_limit():
+    """Lift the soft open-files limit to the hard limit so thousands of sockets fit"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            logging.warning(f"could not raise open file limit: {e}")
+
+
+async def worker(client, task):
+    operation, filename = task
+    if operation == "download":
+        return await client.remote_get(filename)
+    elif operation == "upload":
+        return await client.remote_upload(filename)
+    elif operation == "list":
+        return (await client.remote_list())[0], 0, 0
+    return False, 0, 0
+
+
+async def run_tasks(client, tasks, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(task):
+        async with semaphore:
+            return await worker(client, task)
+
+    return await asyncio.gather(*(bounded(task) for task in tasks))
+
+
+def stress_test(server_ip, server_port, operation, filename, num_workers, concurrency=None):
+    raise_fd_limit()
+    client = FileClient(server_ip, server_port)
+    tasks = [(operation, filename) for _ in range(num_workers)]
+
+    start_time = time.time()
+    results = asyncio.run(run_tasks(client, tasks, concurrency or num_workers))
+
+    total_time = time.time() - start_time
+    successes = sum(1 for result in results if result[0])
+    failures = len(results) - successes
+
+    # Calculate throughput
+    if operation in ["download", "upload"] and successes > 0:
+        total_bytes = sum(result[2] for result in results if result[0])
+        throughput = total_bytes / total_time
+    else:
+        throughput = 0
+
+    return {
+        "operation": operation,
+        "file_size": os.path.getsize(filename) if filename and os.path.exists(filename) else 0,
+        "num_workers": num_workers,
+        "total_time": total_time,
+        "throughput": throughput,
+        "successes": successes,
+        "failures": failures,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server-ip", default="172.16.16.101")
+    parser.add_argument("--server-port", type=int, default=6667)
+    parser.add_argument("--operation", choices=["download", "upload", "list"], required=True)
+    parser.add_argument("--filename")
+    parser.add_argument("--workers", type=int, default=5, help="Number of simulated clients")
+    parser.add_argument("--concurrency", type=int, help="Max connections open at once (default: all workers)")
+    args = parser.parse_args()
+
+    if args.operation in ["download", "upload"] and not args.filename:
+        print("Filename is required for download/upload operations")
+        exit(1)
+
+    logging.basicConfig(level=logging.WARNING)
+    result = stress_test(args.server_ip, args.server_port, args.operation, args.filename, args.workers, args.concurrency)
+
+    print("\nStress Test Results:")
+    print(f"Operation: {result['operation']}")
+    if args.operation in ["download", "upload"]:
+        print(f"File Size: {result['file_size']/1024/1024:.2f} MB")
+    print(f"Workers: {result['num_workers']}")
+    print(f"Total Time: {result['total_time']:.2f} seconds")
+    if args.operation in ["download", "upload"]:
+        print(f"Throughput: {result['throughput']/1024/1024:.2f} MB/s")
+    print(f"Successes: {result['successes']}")
+    print(f"Failures: {result['failures']}")
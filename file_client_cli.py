@@ -3,28 +3,37 @@ import json
 import base64
 import logging
 import os
+import time
+import argparse
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from socket_config import SocketConfig
+from file_interface import LIST_PATTERN
 
 server_address = ("0.0.0.0", 7777)
+sock_config = SocketConfig.from_env()
 
 
 def send_command(command_str=""):
     global server_address
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock_config.apply(sock)
     sock.connect(server_address)
     logging.warning(f"connecting to {server_address}")
     try:
         logging.warning(f"sending message")
         sock.sendall((command_str + "\r\n\r\n").encode())
-        data_received = ""
+        data_received = bytearray()
         while True:
-            data = sock.recv(16)
-            if data:
-                data_received += data.decode()
-                if "\r\n\r\n" in data_received:
-                    break
-            else:
+            data = sock.recv(sock_config.recv_size)
+            if not data:
                 break
-        json_response = data_received.strip("\r\n\r\n")[0]
+            # only look at the tail so large responses aren't rescanned
+            start = max(0, len(data_received) - 3)
+            data_received += data
+            if data_received.find(b"\r\n\r\n", start) >= 0:
+                break
+        json_response = data_received.split(b"\r\n\r\n")[0]
         hasil = json.loads(json_response)
         logging.warning("data received from server:")
         return hasil
@@ -89,7 +98,216 @@ def remote_delete(filename=""):
         return False
 
 
+def remote_listmeta():
+    """{namafile: {name, size, etag}} of every file on the server, or None on failure"""
+    hasil = send_command("LISTMETA")
+    if hasil and hasil.get("status") == "OK":
+        return {entry["name"]: entry for entry in hasil["data"]}
+    print("Gagal:", hasil.get("data", "Unknown error") if hasil else "no response")
+    return None
+
+
+class Mirror:
+    """
+    Sinkronisasi satu direktori lokal dengan server.
+
+    push : upload file lokal yang baru/berubah ke server
+    pull : download file server yang baru/berubah ke direktori lokal
+
+    Status sinkronisasi terakhir (ukuran + mtime lokal dan etag server per file)
+    disimpan di <direktori>/.mirror_state.json, sehingga file yang tidak berubah
+    di kedua sisi dilewati. Transfer berjalan paralel dengan maksimum `jobs`
+    transfer sekaligus.
+    """
+
+    STATE_FILE = ".mirror_state.json"
+
+    def __init__(self, directory, jobs=4, delete=False, dry_run=False):
+        self.directory = os.path.abspath(directory)
+        self.jobs = max(1, jobs)
+        self.delete = delete
+        self.dry_run = dry_run
+        self.state_path = os.path.join(self.directory, self.STATE_FILE)
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def save_state(self):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    @staticmethod
+    def syncable(name):
+        """Names LISTMETA can report; anything else would look new on every push and missing on every pull"""
+        return not name.startswith(".") and " " not in name and fnmatch(name, LIST_PATTERN)
+
+    def local_files(self):
+        files = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            if not self.syncable(entry.name):
+                # the protocol separates parameters with spaces, and LIST only reports LIST_PATTERN
+                logging.warning(f"skipping {entry.name}: not supported by the server listing")
+                continue
+            st = entry.stat()
+            files[entry.name] = dict(size=st.st_size, mtime=st.st_mtime_ns)
+        return files
+
+    def changed_locally(self, name, local):
+        known = self.state.get(name)
+        return known is None or (known["size"], known["mtime"]) != (local["size"], local["mtime"])
+
+    def changed_remotely(self, name, remote):
+        known = self.state.get(name)
+        return known is None or known["etag"] != remote["etag"]
+
+    def remember(self, name, etag):
+        st = os.stat(os.path.join(self.directory, name))
+        self.state[name] = dict(size=st.st_size, mtime=st.st_mtime_ns, etag=etag)
+
+    def upload(self, name):
+        with open(os.path.join(self.directory, name), "rb") as fp:
+            raw = fp.read()
+        hasil = send_command(f"UPLOAD {name} {base64.b64encode(raw).decode()}")
+        if not hasil or hasil.get("status") != "OK":
+            raise RuntimeError(hasil.get("data", "Unknown error") if hasil else "no response")
+        return len(raw), None
+
+    def download(self, name):
+        hasil = send_command(f"GETIF {name}")
+        if not hasil or hasil.get("status") != "OK":
+            raise RuntimeError(hasil.get("data", "Unknown error") if hasil else "no response")
+        raw = base64.b64decode(hasil["data_file"])
+        path = os.path.join(self.directory, name)
+        tmp = os.path.join(self.directory, f".{name}.part")  # hidden, so a later push skips it
+        with open(tmp, "wb") as fp:
+            fp.write(raw)
+        os.replace(tmp, path)
+        return len(raw), hasil["data_etag"]
+
+    def push(self):
+        remote = remote_listmeta()
+        if remote is None:
+            return False
+        local = self.local_files()
+        todo = [
+            name for name in sorted(local)
+            if name not in remote or self.changed_locally(name, local[name]) or self.changed_remotely(name, remote[name])
+        ]
+        extra = sorted(n for n in set(remote) - set(local) if self.syncable(n)) if self.delete else []
+        ok = self.transfer("upload", todo, self.upload, len(local) - len(todo))
+        for name in extra:
+            print(f"delete remote {name}")
+            if not self.dry_run and remote_delete(name):
+                self.state.pop(name, None)
+        if todo and not self.dry_run:
+            # UPLOAD doesn't return the new etag, take it from a fresh listing
+            remote = remote_listmeta() or {}
+            for name in todo:
+                if name in remote and name in self.state:
+                    self.state[name]["etag"] = remote[name]["etag"]
+        self.finish()
+        return ok
+
+    def pull(self):
+        remote = remote_listmeta()
+        if remote is None:
+            return False
+        local = self.local_files()
+        todo = [
+            name for name in sorted(remote)
+            if self.syncable(name) and (
+                name not in local or self.changed_locally(name, local[name]) or self.changed_remotely(name, remote[name])
+            )
+        ]
+        # only names the listing could contain, so an unlisted file is never taken as deleted on the server
+        extra = sorted(n for n in set(local) - set(remote) if self.syncable(n)) if self.delete else []
+        ok = self.transfer("download", todo, self.download, len(remote) - len(todo))
+        for name in extra:
+            print(f"delete local {name}")
+            if not self.dry_run:
+                os.remove(os.path.join(self.directory, name))
+                self.state.pop(name, None)
+        self.finish()
+        return ok
+
+    def transfer(self, label, names, action, unchanged):
+        print(f"{len(names)} file(s) to {label}, {unchanged} unchanged")
+        if not names:
+            return True
+        if self.dry_run:
+            for name in names:
+                print(f"{label} {name}")
+            return True
+
+        total_bytes = 0
+        failed = 0
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {executor.submit(action, name): name for name in names}
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    size, etag = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{done}/{len(names)}] {label} {name} GAGAL: {e}")
+                    continue
+                total_bytes += size
+                self.remember(name, etag)
+                elapsed = time.time() - start_time
+                print(
+                    f"[{done}/{len(names)}] {label} {name} ({size / 1024 / 1024:.2f} MB) "
+                    f"- {total_bytes / 1024 / 1024 / max(elapsed, 1e-9):.2f} MB/s"
+                )
+        elapsed = time.time() - start_time
+        print(
+            f"{len(names) - failed} file(s), {total_bytes / 1024 / 1024:.2f} MB in {elapsed:.2f} s "
+            f"({total_bytes / 1024 / 1024 / max(elapsed, 1e-9):.2f} MB/s), {failed} failed"
+        )
+        return failed == 0
+
+    def finish(self):
+        if not self.dry_run:
+            self.save_state()
+
+
 if __name__ == "__main__":
-    server_address = ("172.16.16.101", 6666)
-    remote_list()
-    remote_get("donalbebek.jpg")
+    parser = argparse.ArgumentParser(description="File server command line client")
+    parser.add_argument("--server", default="172.16.16.101:6666", help="host:port of the file server")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    sub.add_parser("get").add_argument("filename")
+    sub.add_parser("upload").add_argument("filename")
+    sub.add_parser("delete").add_argument("filename")
+    sync = sub.add_parser("sync", help="Mirror a local directory to (push) or from (pull) the server")
+    sync.add_argument("direction", choices=["push", "pull"])
+    sync.add_argument("directory")
+    sync.add_argument("--jobs", type=int, default=4, help="Parallel transfers")
+    sync.add_argument("--delete", action="store_true", help="Also delete files missing on the source side")
+    sync.add_argument("--dry-run", action="store_true", help="Only show what would be transferred")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR)
+    host, _, port = args.server.rpartition(":")
+    server_address = (host, int(port))
+
+    if args.command == "list":
+        ok = remote_list()
+    elif args.command == "get":
+        ok = remote_get(args.filename)
+    elif args.command == "upload":
+        ok = remote_upload(args.filename)
+    elif args.command == "delete":
+        ok = remote_delete(args.filename)
+    else:
+        mirror = Mirror(args.directory, jobs=args.jobs, delete=args.delete, dry_run=args.dry_run)
+        ok = mirror.push() if args.direction == "push" else mirror.pull()
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,232 @@
+import os
+import csv
+import json
+import mmap
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+from file_client_threadpool import FileClient
+from tracing import tracer
+
+"""
+* client untuk proses di mesin yang sama dengan server, lewat Unix domain socket
+  server: python3 file_server_threadpool.py 5 --unix-socket /tmp/file_server.sock
+
+* GET memakai command GETFD: server mengirim file descriptor (SCM_RIGHTS),
+  client menyalin file langsung dari descriptor itu (os.sendfile), tanpa
+  base64/JSON dan tanpa isi file lewat socket
+  python3 file_client_local.py get donalbebek.jpg
+
+* remote_map(nama) memetakan file server ke memori (mmap read-only), halaman
+  file dibagi lewat page cache, tidak disalin
+
+* command lain (LIST, UPLOAD, DELETE, ...) sama dengan FileClient, hanya lewat Unix socket
+
+* benchmark TCP vs Unix socket vs GETFD vs mmap:
+  python3 file_client_local.py bench big.dat --server 127.0.0.1:6667 --runs 5
+"""
+
+DEFAULT_SOCKET = "/tmp/file_server.sock"
+
+
+def copy_fd(src, dst, size):
+    """
+    Copy size bytes from src to dst inside the kernel (sendfile), falling back
+    to a userspace copy. Returns the number of bytes copied, which is short of
+    size if src ended early.
+    """
+    offset = 0
+    try:
+        while offset < size:
+            sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+    except (OSError, AttributeError):
+        # no sendfile between regular files here (e.g. older kernels, macOS)
+        src.seek(offset)
+        dst.seek(offset)
+        while offset < size:
+            chunk = src.read(min(1024 * 1024, size - offset))
+            if not chunk:
+                break
+            dst.write(chunk)
+            offset += len(chunk)
+    return offset
+
+
+def same_file(src, path):
+    """True if path is the file open as src (same device and inode)"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    own = os.fstat(src.fileno())
+    return (st.st_dev, st.st_ino) == (own.st_dev, own.st_ino)
+
+
+class LocalFileClient(FileClient):
+    def __init__(self, socket_path=DEFAULT_SOCKET, cache=None, use_fd=True):
+        super().__init__(None, None, cache)
+        self.server_address = socket_path
+        self.use_fd = use_fd  # False: plain GET over the Unix socket (base64 + JSON)
+
+    def new_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        return sock
+
+    def open_remote(self, filename):
+        """GETFD: (header, file object reading the server's copy) or (error header, None)"""
+        sock = self.new_socket()
+        fds = []
+        try:
+            command_str = tracer.frame(f"GETFD {filename}")
+            with tracer.span("connect"):
+                sock.connect(self.server_address)
+            with tracer.span("send"):
+                sock.sendall((command_str + "\r\n\r\n").encode())
+            with tracer.span("recv"):
+                # the descriptor arrives with the first part of the header
+                data, fds, _, _ = socket.recv_fds(sock, 64 * 1024, 1)
+                while data and b"\r\n\r\n" not in data:
+                    more = sock.recv(64 * 1024)
+                    if not more:
+                        break
+                    data += more
+            header = json.loads(data.split(b"\r\n\r\n")[0])
+        except Exception as e:
+            for fd in fds:
+                os.close(fd)
+            return {"status": "ERROR", "data": str(e)}, None
+        finally:
+            sock.close()
+        if header.get("status") != "OK" or not fds:
+            for fd in fds:
+                os.close(fd)
+            return header, None
+        return header, os.fdopen(fds[0], "rb")
+
+    def _remote_get(self, filename):
+        if not self.use_fd:
+            return super()._remote_get(filename)
+        start_time = time.time()
+        header, src = self.open_remote(filename)
+        if src is None:
+            return False, 0, 0
+        target = os.path.abspath(header["data_namafile"])
+        tmp = None
+        with src:
+            try:
+                if same_file(src, target):
+                    # cwd is the server's storage: the server's copy is the file we'd write
+                    return False, 0, 0
+                # written beside the target and renamed, so the target is never half-written
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=f".{os.path.basename(target)}.", suffix=".part")
+                with tracer.span("write"), os.fdopen(fd, "wb") as dst:
+                    copied = copy_fd(src, dst, header["data_size"])
+                if copied != header["data_size"]:
+                    return False, 0, 0
+                os.replace(tmp, target)
+                tmp = None
+                return True, time.time() - start_time, header["data_size"]
+            except Exception:
+                return False, 0, 0
+            finally:
+                if tmp is not None:
+                    os.unlink(tmp)
+
+    def remote_map(self, filename):
+        """(header, read-only mmap of the server's file); the pages are shared, not copied"""
+        header, src = self.open_remote(filename)
+        if src is None:
+            return header, None
+        with src:
+            if header["data_size"] == 0:
+                return header, b""  # an empty file can't be mapped
+            return header, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def benchmark(socket_path, server_ip, server_port, filename, runs=5):
+    """Median time to fetch filename over TCP, over the Unix socket, with GETFD and with GETFD + mmap"""
+    local = LocalFileClient(socket_path)
+
+    def mapped():
+        start_time = time.time()
+        header, view = local.remote_map(filename)
+        if view is None:
+            return False, 0, 0
+        # touch every page so the comparison includes actually reading the data
+        data = view[:]
+        if isinstance(view, mmap.mmap):
+            view.close()
+        return True, time.time() - start_time, len(data)
+
+    modes = {
+        "tcp": FileClient(server_ip, server_port).remote_get,
+        "unix": LocalFileClient(socket_path, use_fd=False).remote_get,
+        "fd": local.remote_get,
+        "mmap": lambda _: mapped(),
+    }
+    results = []
+    print(f"{'mode':<6} {'ok':>5} {'median s':>10} {'MB/s':>10}")
+    for mode, fetch in modes.items():
+        times = []
+        size = 0
+        for _ in range(runs):
+            ok, elapsed, size = fetch(filename)
+            if ok:
+                times.append(elapsed)
+        median = statistics.median(times) if times else None
+        result = dict(
+            timestamp=datetime.now().isoformat(),
+            mode=mode,
+            file=filename,
+            size=size,
+            runs=runs,
+            ok=len(times),
+            median_s=round(median, 4) if median is not None else "",
+            mb_per_s=round(size / median / 1024 / 1024, 2) if median else "",
+        )
+        results.append(result)
+        print(f"{mode:<6} {len(times):>5} {result['median_s']:>10} {result['mb_per_s']:>10}")
+    return results
+
+
+def save_results_to_csv(results, filename):
+    with open(filename, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nResults saved to {filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="File server client for processes on the same host")
+    parser.add_argument("--unix-socket", default=DEFAULT_SOCKET, help="Server's Unix domain socket")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("list")
+    get = sub.add_parser("get", help="Download a file through its descriptor (GETFD)")
+    get.add_argument("filename")
+    upload = sub.add_parser("upload")
+    upload.add_argument("filename")
+    bench = sub.add_parser("bench", help="Compare TCP, Unix socket, GETFD and mmap downloads")
+    bench.add_argument("filename")
+    bench.add_argument("--server", default="127.0.0.1:6667", help="TCP address of the same server, host:port")
+    bench.add_argument("--runs", type=int, default=5)
+    bench.add_argument("--output", default="local_transport_results.csv")
+    args = parser.parse_args()
+
+    client = LocalFileClient(args.unix_socket)
+    if args.action == "list":
+        print(client.remote_list())
+    elif args.action == "get":
+        print(client.remote_get(args.filename))
+    elif args.action == "upload":
+        print(client.remote_upload(args.filename))
+    else:
+        host, _, port = args.server.rpartition(":")
+        save_results_to_csv(benchmark(args.unix_socket, host, int(port), args.filename, args.runs), args.output)
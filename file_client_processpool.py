@@ -6,46 +6,79 @@ import os
 import time
 from concurrent.futures import ProcessPoolExecutor
 import argparse
+from file_cache import DownloadCache
+from socket_config import SocketConfig
+from tracing import tracer
 from multiprocessing import Manager
 
 class FileClient:
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, cache=None, sock_config=None):
         self.server_address = (server_ip, server_port)
         self.timeout = 300  # 5 minutes timeout for large files
+        self.cache = cache  # optional DownloadCache for conditional GET
+        self.sock_config = sock_config or SocketConfig.from_env()
 
     def send_command(self, command_str):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(self.timeout)
+        self.sock_config.apply(sock)
         try:
-            sock.connect(self.server_address)
-            sock.sendall((command_str + "\r\n\r\n").encode())
+            command_str = tracer.frame(command_str)
+            with tracer.span("connect"):
+                sock.connect(self.server_address)
+            with tracer.span("send"):
+                sock.sendall((command_str + "\r\n\r\n").encode())
             
-            data_received = ""
-            while True:
-                data = sock.recv(1024 * 1024)  # 64KB buffer
-                if data:
-                    data_received += data.decode()
-                    if "\r\n\r\n" in data_received:
+            data_received = bytearray()
+            with tracer.span("recv"):
+                while True:
+                    data = sock.recv(self.sock_config.recv_size)
+                    if not data:
+                        break
+                    # only look at the tail so large responses aren't rescanned
+                    start = max(0, len(data_received) - 3)
+                    data_received += data
+                    if data_received.find(b"\r\n\r\n", start) >= 0:
                         break
-                else:
-                    break
             
-            json_response = data_received.split("\r\n\r\n")[0]
-            return json.loads(json_response)
+            json_response = data_received.split(b"\r\n\r\n")[0]
+            with tracer.span("json"):
+                return json.loads(json_response)
         except Exception as e:
             return {"status": "ERROR", "data": str(e)}
         finally:
             sock.close()
 
     def remote_get(self, filename):
+        with tracer.request("GET", file=filename):
+            return self._remote_get(filename)
+
+    def _remote_get(self, filename):
         start_time = time.time()
-        result = self.send_command(f"GET {filename}")
+        etag = self.cache.etag(filename) if self.cache else None
+        if etag:
+            result = self.send_command(f"GETIF {filename} {etag}")
+        elif self.cache:
+            result = self.send_command(f"GETIF {filename}")
+        else:
+            result = self.send_command(f"GET {filename}")
+
+        if result["status"] == "NOT_MODIFIED":
+            size = self.cache.restore(filename, result["data_namafile"])
+            if size is not None:
+                return True, time.time() - start_time, size
+            # evicted between the lookup and the answer, fetch it in full
+            result = self.send_command(f"GETIF {filename}")
+
         if result["status"] == "OK":
             try:
                 namafile = result["data_namafile"]
-                isifile = base64.b64decode(result["data_file"])
-                with open(namafile, "wb+") as fp:
+                with tracer.span("decode"):
+                    isifile = base64.b64decode(result["data_file"])
+                with tracer.span("write"), open(namafile, "wb+") as fp:
                     fp.write(isifile)
+                if self.cache and "data_etag" in result:
+                    self.cache.store(filename, result["data_etag"], namafile)
                 elapsed = time.time() - start_time
                 return True, elapsed, os.path.getsize(namafile)
             except Exception as e:
@@ -53,6 +86,10 @@ class FileClient:
         return False, 0, 0
 
     def remote_upload(self, filename):
+        with tracer.request("UPLOAD", file=filename):
+            return self._remote_upload(filename)
+
+    def _remote_upload(self, filename):
         start_time = time.time()
         if not os.path.exists(filename):
             return False, 0, 0
@@ -60,7 +97,10 @@ class FileClient:
         try:
             with open(filename, "rb") as fp:
                 file_size = os.path.getsize(filename)
-                encoded = base64.b64encode(fp.read()).decode()
+                with tracer.span("read"):
+                    raw = fp.read()
+                with tracer.span("encode"):
+                    encoded = base64.b64encode(raw).decode()
             
             result = self.send_command(f"UPLOAD {filename} {encoded}")
             elapsed = time.time() - start_time
@@ -71,8 +111,9 @@ class FileClient:
         except Exception as e:
             return False, 0, 0
 
-def worker(server_ip, server_port, task):
-    client = FileClient(server_ip, server_port)
+def worker(server_ip, server_port, task, cache_dir=None, cache_size_mb=1024):
+    cache = DownloadCache(cache_dir, cache_size_mb * 1024 * 1024) if cache_dir else None
+    client = FileClient(server_ip, server_port, cache)
     operation, filename = task
     if operation == "download":
         return client.remote_get(filename)
@@ -80,14 +121,14 @@ def worker(server_ip, server_port, task):
         return client.remote_upload(filename)
     return False, 0, 0
 
-def stress_test(server_ip, server_port, operation, filename, num_workers):
+def stress_test(server_ip, server_port, operation, filename, num_workers, cache_dir=None, cache_size_mb=1024):
     tasks = [(operation, filename) for _ in range(num_workers)]
     
     start_time = time.time()
     results = []
     
     with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        futures = [executor.submit(worker, server_ip, server_port, task) for task in tasks]
+        futures = [executor.submit(worker, server_ip, server_port, task, cache_dir, cache_size_mb) for task in tasks]
         for future in futures:
             results.append(future.result())
     
@@ -119,6 +160,8 @@ if __name__ == "__main__":
     parser.add_argument("--operation", choices=["download", "upload"], required=True)
     parser.add_argument("--filename")
     parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--cache-dir", help="Keep downloads in this cache and use conditional GET")
+    parser.add_argument("--cache-size-mb", type=int, default=1024, help="Cache size limit before LRU eviction")
     args = parser.parse_args()
     
     if args.operation in ["download", "upload"] and not args.filename:
@@ -126,7 +169,10 @@ if __name__ == "__main__":
         exit(1)
     
     logging.basicConfig(level=logging.WARNING)
-    result = stress_test(args.server_ip, args.server_port, args.operation, args.filename, args.workers)
+    result = stress_test(
+        args.server_ip, args.server_port, args.operation, args.filename, args.workers,
+        cache_dir=args.cache_dir, cache_size_mb=args.cache_size_mb,
+    )
     
     print("\nStress Test Results:")
     print(f"Operation: {result['operation']}")
@@ -6,51 +6,89 @@ import os
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+from file_cache import DownloadCache
+from socket_config import SocketConfig
+from tracing import tracer
 
 class FileClient:
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, cache=None, sock_config=None):
         self.server_address = (server_ip, server_port)
         self.timeout = 300  # 5 minutes timeout for large files
+        self.cache = cache  # optional DownloadCache for conditional GET
+        self.sock_config = sock_config or SocketConfig.from_env()
 
-    def send_command(self, command_str):
+    def new_socket(self):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(self.timeout)
+        self.sock_config.apply(sock)
+        return sock
+
+    def send_command(self, command_str):
+        sock = self.new_socket()
         try:
-            sock.connect(self.server_address)
-            sock.sendall((command_str + "\r\n\r\n").encode())
+            command_str = tracer.frame(command_str)
+            with tracer.span("connect"):
+                sock.connect(self.server_address)
+            with tracer.span("send"):
+                sock.sendall((command_str + "\r\n\r\n").encode())
             
-            data_received = ""
-            while True:
-                data = sock.recv(1024 * 1024)  # 64KB buffer
-                if data:
-                    data_received += data.decode()
-                    if "\r\n\r\n" in data_received:
+            data_received = bytearray()
+            with tracer.span("recv"):
+                while True:
+                    data = sock.recv(self.sock_config.recv_size)
+                    if not data:
+                        break
+                    # only look at the tail so large responses aren't rescanned
+                    start = max(0, len(data_received) - 3)
+                    data_received += data
+                    if data_received.find(b"\r\n\r\n", start) >= 0:
                         break
-                else:
-                    break
             
-            json_response = data_received.split("\r\n\r\n")[0]
-            return json.loads(json_response)
+            json_response = data_received.split(b"\r\n\r\n")[0]
+            with tracer.span("json"):
+                return json.loads(json_response)
         except Exception as e:
             return {"status": "ERROR", "data": str(e)}
         finally:
             sock.close()
 
     def remote_list(self):
-        result = self.send_command("LIST")
+        with tracer.request("LIST"):
+            result = self.send_command("LIST")
         if result["status"] == "OK":
             return True, result["data"]
         return False, result.get("data", "Unknown error")
 
     def remote_get(self, filename):
+        with tracer.request("GET", file=filename):
+            return self._remote_get(filename)
+
+    def _remote_get(self, filename):
         start_time = time.time()
-        result = self.send_command(f"GET {filename}")
+        etag = self.cache.etag(filename) if self.cache else None
+        if etag:
+            result = self.send_command(f"GETIF {filename} {etag}")
+        elif self.cache:
+            result = self.send_command(f"GETIF {filename}")
+        else:
+            result = self.send_command(f"GET {filename}")
+
+        if result["status"] == "NOT_MODIFIED":
+            size = self.cache.restore(filename, result["data_namafile"])
+            if size is not None:
+                return True, time.time() - start_time, size
+            # evicted between the lookup and the answer, fetch it in full
+            result = self.send_command(f"GETIF {filename}")
+
         if result["status"] == "OK":
             try:
                 namafile = result["data_namafile"]
-                isifile = base64.b64decode(result["data_file"])
-                with open(namafile, "wb+") as fp:
+                with tracer.span("decode"):
+                    isifile = base64.b64decode(result["data_file"])
+                with tracer.span("write"), open(namafile, "wb+") as fp:
                     fp.write(isifile)
+                if self.cache and "data_etag" in result:
+                    self.cache.store(filename, result["data_etag"], namafile)
                 elapsed = time.time() - start_time
                 return True, elapsed, os.path.getsize(namafile)
             except Exception as e:
@@ -58,6 +96,10 @@ class FileClient:
         return False, 0, 0
 
     def remote_upload(self, filename):
+        with tracer.request("UPLOAD", file=filename):
+            return self._remote_upload(filename)
+
+    def _remote_upload(self, filename):
         start_time = time.time()
         if not os.path.exists(filename):
             return False, 0, 0
@@ -65,7 +107,10 @@ class FileClient:
         try:
             with open(filename, "rb") as fp:
                 file_size = os.path.getsize(filename)
-                encoded = base64.b64encode(fp.read()).decode()
+                with tracer.span("read"):
+                    raw = fp.read()
+                with tracer.span("encode"):
+                    encoded = base64.b64encode(raw).decode()
             
             result = self.send_command(f"UPLOAD {filename} {encoded}")
             elapsed = time.time() - start_time
@@ -86,8 +131,9 @@ def worker(client, task):
         return client.remote_list()[0], 0, 0
     return False, 0, 0
 
-def stress_test(server_ip, server_port, operation, filename, num_workers):
-    client = FileClient(server_ip, server_port)
+def stress_test(server_ip, server_port, operation, filename, num_workers, cache_dir=None, cache_size_mb=1024):
+    cache = DownloadCache(cache_dir, cache_size_mb * 1024 * 1024) if cache_dir else None
+    client = FileClient(server_ip, server_port, cache)
     tasks = [(operation, filename) for _ in range(num_workers)]
     
     start_time = time.time()
@@ -126,6 +172,8 @@ if __name__ == "__main__":
     parser.add_argument("--operation", choices=["download", "upload"], required=True)
     parser.add_argument("--filename")
     parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--cache-dir", help="Keep downloads in this cache and use conditional GET")
+    parser.add_argument("--cache-size-mb", type=int, default=1024, help="Cache size limit before LRU eviction")
     args = parser.parse_args()
     
     if args.operation in ["download", "upload"] and not args.filename:
@@ -133,7 +181,10 @@ if __name__ == "__main__":
         exit(1)
     
     logging.basicConfig(level=logging.WARNING)
-    result = stress_test(args.server_ip, args.server_port, args.operation, args.filename, args.workers)
+    result = stress_test(
+        args.server_ip, args.server_port, args.operation, args.filename, args.workers,
+        cache_dir=args.cache_dir, cache_size_mb=args.cache_size_mb,
+    )
     
     print("\nStress Test Results:")
     print(f"Operation: {result['operation']}")
@@ -1,48 +1,166 @@
 import os
 import json
 import base64
-from glob import glob
+import resource_stats
+from file_storage import storage_from_env, error_message
+from tracing import tracer
+
+# multiple of 3 so every chunk base64-encodes without padding
+STREAM_CHUNK = 3 * 256 * 1024
+# LIST and LISTMETA report the same set of files
+LIST_PATTERN = "*.*"
 
 
 class FileInterface:
-    def __init__(self):
-        os.chdir("files/")
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else storage_from_env()
 
     def list(self, params=[]):
         try:
-            filelist = glob("*.*")
+            with tracer.span("read"):
+                filelist = self.storage.list(LIST_PATTERN)
             return dict(status="OK", data=filelist)
         except Exception as e:
-            return dict(status="ERROR", data=str(e))
+            return dict(status="ERROR", data=error_message(e))
+
+    def listmeta(self, params=[]):
+        """LIST plus size and etag of every file, so a client can tell which files changed"""
+        try:
+            filelist = []
+            with tracer.span("read"):
+                for name in self.storage.list(LIST_PATTERN):
+                    try:
+                        st = self.storage.stat(name)
+                    except FileNotFoundError:
+                        continue  # deleted while listing
+                    filelist.append(dict(name=name, size=st.st_size, etag=self.etag(st)))
+            return dict(status="OK", data=filelist)
+        except Exception as e:
+            return dict(status="ERROR", data=error_message(e))
 
     def get(self, params=[]):
         try:
             filename = params[0]
             if filename == "":
                 return None
-            fp = open(f"{filename}", "rb")
-            isifile = base64.b64encode(fp.read()).decode()
+            fp = self.storage.open_read(filename)
+            with tracer.span("read"):
+                raw = fp.read()
+            with tracer.span("encode"):
+                isifile = base64.b64encode(raw).decode()
             return dict(status="OK", data_namafile=filename, data_file=isifile)
         except Exception as e:
-            return dict(status="ERROR", data=str(e))
+            return dict(status="ERROR", data=error_message(e))
+
+    def get_stream(self, params=[]):
+        """Same JSON as json.dumps(self.get(params)), yielded piece by piece as bytes"""
+        try:
+            filename = params[0]
+            if filename == "":
+                yield json.dumps(None).encode()
+                return
+            fp = self.storage.open_read(filename)
+        except Exception as e:
+            yield json.dumps(dict(status="ERROR", data=error_message(e))).encode()
+            return
+        yield from self._stream_file(fp, dict(status="OK", data_namafile=filename))
+
+    def getif(self, params=[]):
+        """GET kondisional: GETIF namafile [etag]; isi file hanya dikirim jika etag berbeda"""
+        try:
+            filename = params[0]
+            known = params[1] if len(params) > 1 else ""
+            with self.storage.open_read(filename) as fp:
+                etag = self.etag(os.fstat(fp.fileno()))
+                if etag == known:
+                    return dict(status="NOT_MODIFIED", data_namafile=filename, data_etag=etag)
+                with tracer.span("read"):
+                    raw = fp.read()
+            with tracer.span("encode"):
+                isifile = base64.b64encode(raw).decode()
+            return dict(status="OK", data_namafile=filename, data_etag=etag, data_file=isifile)
+        except Exception as e:
+            return dict(status="ERROR", data=error_message(e))
+
+    def getif_stream(self, params=[]):
+        """Same JSON as json.dumps(self.getif(params)), yielded piece by piece as bytes"""
+        try:
+            filename = params[0]
+            known = params[1] if len(params) > 1 else ""
+            fp = self.storage.open_read(filename)
+            etag = self.etag(os.fstat(fp.fileno()))
+        except Exception as e:
+            yield json.dumps(dict(status="ERROR", data=error_message(e))).encode()
+            return
+        if etag == known:
+            fp.close()
+            yield json.dumps(dict(status="NOT_MODIFIED", data_namafile=filename, data_etag=etag)).encode()
+            return
+        yield from self._stream_file(fp, dict(status="OK", data_namafile=filename, data_etag=etag))
+
+    def getfd(self, params=[]):
+        """
+        GETFD namafile: (header, open file). Only the Unix socket transport can
+        answer this, by passing the descriptor to the client instead of the contents.
+        """
+        try:
+            filename = params[0]
+            fp = self.storage.open_read(filename)
+        except Exception as e:
+            return dict(status="ERROR", data=error_message(e)), None
+        st = os.fstat(fp.fileno())
+        return dict(status="OK", data_namafile=filename, data_size=st.st_size, data_etag=self.etag(st)), fp
+
+    @staticmethod
+    def etag(st):
+        # validator = ukuran + mtime (ns), cukup untuk mendeteksi file yang berubah
+        return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    @staticmethod
+    def _stream_file(fp, fields):
+        with fp:
+            head = json.dumps(dict(fields, data_file=""))
+            # the JSON prefix/suffix ride along with the first/last chunk
+            with tracer.span("read"):
+                chunk = fp.read(STREAM_CHUNK)
+            with tracer.span("encode"):
+                pending = head[:-2].encode() + base64.b64encode(chunk)
+            while True:
+                with tracer.span("read"):
+                    chunk = fp.read(STREAM_CHUNK)
+                if not chunk:
+                    break
+                yield pending
+                with tracer.span("encode"):
+                    pending = base64.b64encode(chunk)
+            yield pending + head[-2:].encode()
+
+    def stats(self, params=[]):
+        """STATS [jumlah]: resource usage of the process that serves this request"""
+        try:
+            limit = int(params[0]) if params and params[0] else 10
+            return dict(status="OK", data=resource_stats.snapshot(limit))
+        except Exception as e:
+            return dict(status="ERROR", data=error_message(e))
 
     def upload(self, params=[]):
         try:
             filename, data_b64 = params[0], params[1]
-            raw = base64.b64decode(data_b64)
-            with open(filename, "wb") as f:
+            with tracer.span("decode"):
+                raw = base64.b64decode(data_b64)
+            with tracer.span("write"), self.storage.open_write(filename) as f:
                 f.write(raw)
             return dict(status="OK", data="File uploaded")
         except Exception as e:
-            return dict(status="ERROR", data=str(e))
+            return dict(status="ERROR", data=error_message(e))
 
     def delete(self, params=[]):
         try:
             filename = params[0]
-            os.remove(filename)
+            self.storage.remove(filename)
             return dict(status="OK", data="File deleted")
         except Exception as e:
-            return dict(status="ERROR", data=str(e))
+            return dict(status="ERROR", data=error_message(e))
 
 
 if __name__ == "__main__":
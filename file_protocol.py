@@ -3,6 +3,8 @@ import logging
 import shlex
 
 from file_interface import FileInterface
+from tracing import tracer
+from workload_trace import recorder
 
 """
 * class FileProtocol bertugas untuk memproses 
@@ -17,22 +19,67 @@ string
 """
 
 
+# request yang dilayani; method FileInterface lain (get_stream, etag, ...) hanya helper
+COMMANDS = ('list','listmeta','get','getif','upload','delete','stats')
+# GETFD mengirim file descriptor, hanya mungkin lewat Unix socket (lihat file_server_threadpool.py)
+GETFD_ERROR = dict(status='ERROR',data='GETFD hanya dilayani lewat Unix socket (server dengan --unix-socket)')
+
 
 class FileProtocol:
     def __init__(self):
         self.file = FileInterface()
     def proses_string(self,string_datamasuk=''):
         # logging.warning(f"string diproses: {string_datamasuk}")
-        c = string_datamasuk.split(' ')
+        with tracer.span("parse"):
+            c = string_datamasuk.split(' ')
         try:
             c_request = c[0].strip().lower()
             # logging.warning(f"memproses request: {c_request}")
+            if c_request == 'getfd':
+                return json.dumps(GETFD_ERROR)
+            if c_request not in COMMANDS:
+                raise ValueError(c_request)
             params = [x for x in c[1:]]
             cl = getattr(self.file,c_request)(params)
-            return json.dumps(cl)
+            with tracer.span("json"):
+                return json.dumps(cl)
         except Exception:
             return json.dumps(dict(status='ERROR',data='request tidak dikenali'))
 
+    def proses_string_stream(self,string_datamasuk='',terminator=b'\r\n\r\n'):
+        chunks = self._proses_string_stream(string_datamasuk,terminator)
+        if recorder.enabled:
+            return recorder.stream(string_datamasuk,chunks,self.file.storage)
+        return chunks
+
+    def _proses_string_stream(self,string_datamasuk='',terminator=b'\r\n\r\n'):
+        # sama dengan proses_string, tetapi hasil GET dikirim bertahap (bytes)
+        # sehingga file besar tidak perlu dimuat utuh sebagai base64 + JSON.
+        # terminator ditempel ke potongan terakhir agar respon kecil cukup satu kali send
+        with tracer.span("parse"):
+            c = string_datamasuk.split(' ')
+            c_request = c[0].strip().lower()
+        if c_request == 'get':
+            chunks = self.file.get_stream(c[1:])
+        elif c_request == 'getif':
+            chunks = self.file.getif_stream(c[1:])
+        else:
+            chunks = iter([self.proses_string(string_datamasuk).encode()])
+        pending = next(chunks)
+        for chunk in chunks:
+            yield pending
+            pending = chunk
+        yield pending + terminator
+
+    def proses_getfd(self,string_datamasuk='',terminator=b'\r\n\r\n'):
+        # GETFD lewat Unix socket: hasilnya header JSON + file yang terbuka,
+        # file descriptor-nya dikirim server dengan SCM_RIGHTS
+        with tracer.span("parse"):
+            params = string_datamasuk.split(' ')[1:]
+        with tracer.span("open"):
+            header, fp = self.file.getfd(params)
+        return json.dumps(header).encode() + terminator, fp
+
 
 if __name__=='__main__':
     #contoh pemakaian
@@ -0,0 +1,307 @@
+import socket
+import threading
+import logging
+import argparse
+import hashlib
+import bisect
+import json
+from concurrent.futures import ThreadPoolExecutor
+from socket_config import SocketConfig
+from log_config import setup_from_env
+from tracing import tracer, split_trace
+
+"""
+* file_proxy meneruskan request protokol file server ke beberapa backend
+  (misal beberapa file_server_threadpool.py di port/host berbeda)
+
+* GET/GETIF dirutekan ke pemilik file (consistent hashing nama file) atau ke
+  pemilik yang paling sedikit koneksinya; byte respon diteruskan apa adanya
+* UPLOAD/DELETE dikirim ke semua pemilik file (replika)
+* LIST/LISTMETA digabung dari semua backend
+"""
+
+TERMINATOR = b"\r\n\r\n"
+
+
+class HashRing:
+    def __init__(self, nodes, vnodes=100):
+        self.nodes = list(nodes)
+        self.ring = []
+        for node in self.nodes:
+            for i in range(vnodes):
+                self.ring.append((self._hash(f"{node}#{i}"), node))
+        self.ring.sort()
+        self.keys = [h for h, _ in self.ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def owners(self, key, count=1):
+        """The first `count` distinct nodes clockwise from the key's position"""
+        count = min(count, len(self.nodes))
+        owners = []
+        i = bisect.bisect(self.keys, self._hash(key))
+        while len(owners) < count:
+            node = self.ring[i % len(self.ring)][1]
+            if node not in owners:
+                owners.append(node)
+            i += 1
+        return owners
+
+
+class BackendPool:
+    """
+    Keep-alive connections to one backend, plus an active request counter.
+
+    The pool servers dedicate a worker to a connection until it closes, so
+    max_conns must not exceed the backend's pool size or pooled connections
+    would starve new ones.
+    """
+
+    def __init__(self, address, max_conns=5, timeout=300, sock_config=None):
+        self.address = address
+        self.timeout = timeout
+        self.sock_config = sock_config or SocketConfig.from_env()
+        self.slots = threading.BoundedSemaphore(max_conns)
+        self.idle = []
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return f"{self.address[0]}:{self.address[1]}"
+
+    def acquire(self):
+        self.slots.acquire()
+        with self.lock:
+            self.active += 1
+            if self.idle:
+                return self.idle.pop(), True
+        try:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+        except OSError:
+            self.release(None, reuse=False)
+            raise
+        # small request/response round trips on a reused connection must not wait
+        # for Nagle / delayed ACK, whatever the configured socket options are
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock_config.apply(sock)
+        return sock, False
+
+    def release(self, sock, reuse=True):
+        with self.lock:
+            self.active -= 1
+            if reuse:
+                self.idle.append(sock)
+            elif sock is not None:
+                sock.close()
+        self.slots.release()
+
+
+class Proxy:
+    def __init__(self, ipaddress="0.0.0.0", port=6667, backends=(), policy="hash", replicas=1, pool_size=50, backend_conns=5, sock_config=None):
+        self.ipinfo = (ipaddress, port)
+        self.sock_config = sock_config or SocketConfig.from_env()
+        self.pools = {
+            str(p): p for p in (BackendPool(b, max_conns=backend_conns, sock_config=self.sock_config) for b in backends)
+        }
+        self.ring = HashRing(self.pools.keys())
+        self.policy = policy
+        self.replicas = max(1, replicas)
+        self.pool_size = pool_size
+        self.thread_pool = ThreadPoolExecutor(max_workers=pool_size)
+        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    def start(self):
+        logging.warning(f"Proxy running at {self.ipinfo} -> {list(self.pools)} (policy={self.policy}, replicas={self.replicas})")
+        self.my_socket.bind(self.ipinfo)
+        self.sock_config.listen(self.my_socket)
+
+        try:
+            while True:
+                connection, client_address = self.my_socket.accept()
+                logging.warning("Connection from %s", client_address, extra={"event": "connect"})
+                self.sock_config.apply(connection)
+                self.thread_pool.submit(self.handle_client, connection, client_address)
+        except KeyboardInterrupt:
+            logging.warning("Shutting down proxy...")
+        finally:
+            self.thread_pool.shutdown()
+            self.my_socket.close()
+
+    def handle_client(self, connection, client_address):
+        buffer = bytearray()
+        search_from = 0
+        try:
+            while True:
+                data = connection.recv(self.sock_config.recv_size)
+                if not data:
+                    break
+                buffer += data
+                while True:
+                    # don't rescan what was already searched while a big UPLOAD trickles in
+                    end = buffer.find(TERMINATOR, search_from)
+                    if end < 0:
+                        search_from = max(0, len(buffer) - 3)
+                        break
+                    command = bytes(buffer[:end])
+                    del buffer[:end + 4]
+                    search_from = 0
+                    self.route(connection, command, client_address)
+        except Exception as e:
+            logging.error(f"Error handling client {client_address}: {str(e)}")
+        finally:
+            connection.close()
+            logging.warning("Connection closed for %s", client_address, extra={"event": "close"})
+
+    def route(self, connection, command, client_address):
+        trace_id, bare = split_trace(command)
+        with tracer.request(bare, trace_id, flow=False, conn=f"{client_address[0]}:{client_address[1]}") as current:
+            if trace_id is not None:
+                # a step on the client's arrow; the trace prefix is forwarded so backends end it
+                tracer.flow("t", trace_id)
+            elif current is not None:
+                command = tracer.frame(bare)
+            self.route_command(connection, command, bare)
+
+    def route_command(self, connection, command, bare):
+        verb, _, rest = bare.partition(b" ")
+        verb = verb.strip().lower()
+        filename = rest.split(b" ", 1)[0].decode(errors="replace")
+        logging.warning("Routing: %s...", command[:50], extra={"event": "command"})
+
+        if verb in (b"list", b"listmeta"):
+            connection.sendall(self.merged_list(command, meta=verb == b"listmeta"))
+        elif verb in (b"upload", b"delete"):
+            connection.sendall(self.replicate(self.owners(filename), command))
+        elif verb in (b"get", b"getif"):
+            self.forward(connection, self.pick(self.owners(filename)), command)
+        else:
+            self.forward(connection, self.least_loaded(self.pools.values()), command)
+
+    def owners(self, filename):
+        return [self.pools[name] for name in self.ring.owners(filename, self.replicas)]
+
+    def pick(self, owners):
+        if self.policy == "least-conn":
+            return self.least_loaded(owners)
+        return owners
+
+    @staticmethod
+    def least_loaded(candidates):
+        return sorted(candidates, key=lambda p: p.active)
+
+    def exchange(self, pool, command, sink=None):
+        """
+        Send one command to a backend and read its response up to the terminator.
+        With a sink the response bytes are passed through as they arrive, otherwise
+        they are collected and returned. A raised OSError carries forwarded: True
+        once part of the response already went to the sink.
+        """
+        for attempt in range(2):
+            received = 0
+            try:
+                sock, reused = pool.acquire()
+            except OSError as e:
+                e.forwarded = False
+                raise
+            collected = bytearray()
+            tail = b""
+            try:
+                sock.sendall(command + TERMINATOR)
+                while True:
+                    data = sock.recv(self.sock_config.recv_size)
+                    if not data:
+                        raise ConnectionError(f"backend {pool} closed the connection")
+                    received += len(data)
+                    if sink is not None:
+                        sink(data)
+                    else:
+                        collected += data
+                    window = tail + data[-4:] if len(data) < 4 else data[-4:]
+                    if window.endswith(TERMINATOR):
+                        pool.release(sock)
+                        return bytes(collected)
+                    tail = window[-3:]
+            except OSError as e:
+                pool.release(sock, reuse=False)
+                # a pooled connection may have gone stale; retry once on a fresh one
+                if reused and received == 0 and attempt == 0:
+                    continue
+                e.forwarded = sink is not None and received > 0
+                raise
+
+    def forward(self, connection, candidates, command):
+        last_error = "no backend available"
+        for pool in candidates:
+            try:
+                self.exchange(pool, command, sink=connection.sendall)
+                return
+            except OSError as e:
+                # once the client has part of a response, another backend can't take over
+                if e.forwarded:
+                    raise
+                logging.warning(f"Backend {pool} failed, trying the next one: {e}")
+                last_error = f"{pool}: {e}"
+        connection.sendall(self.error(last_error))
+
+    def replicate(self, owners, command):
+        response = None
+        for pool in owners:
+            try:
+                result = self.exchange(pool, command)
+            except OSError as e:
+                logging.error(f"Replication to {pool} failed: {e}")
+                result = self.error(f"{pool}: {e}")
+            # report the first failure, otherwise the primary owner's answer
+            if response is None or (b'"ERROR"' in result and b'"ERROR"' not in response):
+                response = result
+        return response
+
+    def merged_list(self, command, meta=False):
+        # LISTMETA entries are dicts; a replicated file is reported once
+        filelist = {}
+        for pool in self.pools.values():
+            try:
+                result = json.loads(self.exchange(pool, command)[:-4])
+            except (OSError, ValueError) as e:
+                return self.error(f"{pool}: {e}")
+            if result.get("status") != "OK":
+                return json.dumps(result).encode() + TERMINATOR
+            for entry in result["data"]:
+                filelist.setdefault(entry["name"] if meta else entry, entry)
+        data = [filelist[name] for name in sorted(filelist)]
+        return json.dumps(dict(status="OK", data=data)).encode() + TERMINATOR
+
+    @staticmethod
+    def error(message):
+        return json.dumps(dict(status="ERROR", data=message)).encode() + TERMINATOR
+
+
+def parse_backend(value):
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-balancing proxy over several file servers")
+    parser.add_argument("backends", nargs="+", type=parse_backend, help="Backend addresses as host:port")
+    parser.add_argument("--port", type=int, default=6667, help="Port the proxy listens on")
+    parser.add_argument("--policy", choices=["hash", "least-conn"], default="hash", help="How GET picks among a file's owners")
+    parser.add_argument("--replicas", type=int, default=1, help="Number of backends that own each file")
+    parser.add_argument("--pool-size", type=int, default=50, help="Client handler threads")
+    parser.add_argument("--backend-conns", type=int, default=5, help="Connections kept per backend (<= backend pool size)")
+    args = parser.parse_args()
+
+    setup_from_env()
+    proxy = Proxy(
+        ipaddress="0.0.0.0",
+        port=args.port,
+        backends=args.backends,
+        policy=args.policy,
+        replicas=args.replicas,
+        pool_size=args.pool_size,
+        backend_conns=args.backend_conns,
+    )
+    proxy.start()
@@ -1,62 +1,146 @@
 from socket import *
 import socket
 import threading
+import multiprocessing
+import argparse
 import logging
 import time
 import sys
 
 
 from file_protocol import FileProtocol
+from socket_config import SocketConfig
+from log_config import setup_from_env
+from tracing import tracer, split_trace
+import resource_stats
 
 fp = FileProtocol()
+sock_config = SocketConfig.from_env()
 
 
 class ProcessTheClient(threading.Thread):
-    def __init__(self, connection, address):
+    def __init__(self, connection, address, on_done=None):
         self.connection = connection
         self.address = address
-        threading.Thread.__init__(self)
+        self.on_done = on_done
+        threading.Thread.__init__(self, daemon=True)
 
     def run(self):
         buffer = ""
-        while True:
-            data = self.connection.recv(32)
-            if not data:
-                break
-            buffer += data.decode()
-            while "\r\n\r\n" in buffer:
-                command_str, buffer = buffer.split("\r\n\r\n", 1)
-                logging.warning(f"command_str: {command_str}")
-                hasil = fp.proses_string(command_str)
-                response = hasil + "\r\n\r\n"
-                logging.warning(f"response: {response}")
-                self.connection.sendall(response.encode())
-        self.connection.close()
+        try:
+            while True:
+                data = self.connection.recv(sock_config.recv_size)
+                if not data:
+                    break
+                buffer += data.decode()
+                while "\r\n\r\n" in buffer:
+                    command_str, buffer = buffer.split("\r\n\r\n", 1)
+                    logging.warning("command_str: %s", command_str, extra={"event": "command"})
+                    trace_id, command_str = split_trace(command_str)
+                    with tracer.request(command_str, trace_id, conn=f"{self.address[0]}:{self.address[1]}"):
+                        sent = sock_config.send_chunks(self.connection, tracer.send_spans(fp.proses_string_stream(command_str)))
+                    logging.warning("response: %d bytes", sent, extra={"event": "response"})
+        except OSError as e:
+            logging.error(f"error on {self.address}: {e}")
+        finally:
+            self.connection.close()
+            if self.on_done:
+                self.on_done(self)
 
 
 class Server(threading.Thread):
-    def __init__(self, ipaddress="0.0.0.0", port=8889):
+    """
+    acceptors  : jumlah thread (mode threads) atau proses (mode processes)
+                 yang memanggil accept()
+    mode       : threads   -> semua acceptor berbagi satu listening socket
+                 processes -> tiap proses punya socket sendiri dengan
+                              SO_REUSEPORT, kernel membagi koneksi;
+                              prosesnya dibuat main() lewat run_acceptor,
+                              satu Server per proses
+    backlog    : panjang antrian listen (default dari SocketConfig)
+    """
+
+    def __init__(self, ipaddress="0.0.0.0", port=8889, acceptors=1, mode="threads", backlog=None):
         self.ipinfo = (ipaddress, port)
-        self.the_clients = []
-        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.acceptors = max(1, acceptors)
+        self.mode = mode
+        self.backlog = backlog or sock_config.backlog
+        self.the_clients = set()
+        self.clients_lock = threading.Lock()
+        self.my_socket = None
+        resource_stats.register_provider("clients", lambda: len(self.the_clients))
         threading.Thread.__init__(self)
 
+    def make_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.mode == "processes":
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(self.ipinfo)
+        sock_config.apply(sock)
+        sock.listen(self.backlog)
+        return sock
+
     def run(self):
-        logging.warning(f"server berjalan di ip address {self.ipinfo}")
-        self.my_socket.bind(self.ipinfo)
-        self.my_socket.listen(1)
+        logging.warning(f"server berjalan di ip address {self.ipinfo} ({self.acceptors} acceptor {self.mode}, backlog {self.backlog})")
+        self.serve()
+
+    def serve(self):
+        self.my_socket = self.make_socket()
+        threads = 1 if self.mode == "processes" else self.acceptors
+        for i in range(threads - 1):
+            threading.Thread(target=self.accept_loop, name=f"acceptor-{i + 1}", daemon=True).start()
+        self.accept_loop()
+
+    def accept_loop(self):
         while True:
-            self.connection, self.client_address = self.my_socket.accept()
-            logging.warning(f"connection from {self.client_address}")
+            connection, client_address = self.my_socket.accept()
+            logging.warning("connection from %s", client_address, extra={"event": "connect"})
+            sock_config.apply(connection)
 
-            clt = ProcessTheClient(self.connection, self.client_address)
+            clt = ProcessTheClient(connection, client_address, on_done=self.reap)
+            with self.clients_lock:
+                self.the_clients.add(clt)
             clt.start()
-            self.the_clients.append(clt)
+
+    def reap(self, clt):
+        # handler yang sudah selesai dilepas agar memori tidak terus bertambah
+        with self.clients_lock:
+            self.the_clients.discard(clt)
+
+
+def run_acceptor(ipaddress, port, backlog):
+    """One acceptor process of mode processes; module-level so it can be started with spawn/forkserver too"""
+    setup_from_env()
+    resource_stats.start_tracemalloc_from_env()
+    Server(ipaddress=ipaddress, port=port, acceptors=1, mode="processes", backlog=backlog).serve()
 
 
 def main():
-    svr = Server(ipaddress="0.0.0.0", port=6667)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--acceptors", type=int, default=1, help="Number of accepting threads/processes")
+    parser.add_argument("--mode", choices=["threads", "processes"], default="threads", help="processes uses SO_REUSEPORT")
+    parser.add_argument("--backlog", type=int, help="listen() backlog (default FILE_SOCK_BACKLOG or 100)")
+    args = parser.parse_args()
+
+    if args.mode == "processes":
+        # started before this process runs any thread (the logging listener included)
+        workers = [
+            multiprocessing.Process(target=run_acceptor, args=("0.0.0.0", args.port, args.backlog), daemon=True)
+            for _ in range(args.acceptors)
+        ]
+        for w in workers:
+            w.start()
+        setup_from_env()
+        logging.warning(f"server berjalan di port {args.port} ({args.acceptors} acceptor processes, backlog {args.backlog or sock_config.backlog})")
+        for w in workers:
+            w.join()
+        return
+
+    setup_from_env()
+    resource_stats.start_tracemalloc_from_env()
+    svr = Server(ipaddress="0.0.0.0", port=args.port, acceptors=args.acceptors, mode=args.mode, backlog=args.backlog)
     svr.start()
 
 
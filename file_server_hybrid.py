@@ -0,0 +1,349 @@
+import socket
+import selectors
+import logging
+import argparse
+import base64
+import json
+import os
+import time
+import queue
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from file_protocol import FileProtocol
+from file_storage import error_message
+from socket_config import SocketConfig
+from log_config import setup_from_env
+from tracing import tracer, split_trace
+from workload_trace import recorder
+import resource_stats
+
+fp = FileProtocol()
+
+# payloads at or above this size are encoded/decoded in the process pool
+OFFLOAD_THRESHOLD = 1024 * 1024
+
+
+def encode_get(filename, with_etag=False, trace_id=None):
+    """Worker: read a file and build its GET/GETIF response inside a shared memory segment"""
+    with tracer.request("GETIF" if with_etag else "GET", trace_id, flow=False):
+        return _encode_get(filename, with_etag)
+
+
+def _encode_get(filename, with_etag):
+    try:
+        fields = dict(status="OK", data_namafile=filename)
+        with fp.file.storage.open_read(filename) as f:
+            if with_etag:
+                fields["data_etag"] = fp.file.etag(os.fstat(f.fileno()))
+            with tracer.span("read"):
+                raw = f.read()
+        head = json.dumps(dict(fields, data_file=""))[:-2].encode()
+        size = len(head) + 4 * ((len(raw) + 2) // 3) + 2
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        # the parent owns the segment from here on and unlinks it after sending
+        resource_tracker.unregister(shm._name, "shared_memory")
+        pos = len(head)
+        shm.buf[:pos] = head
+        with tracer.span("encode"):
+            encoded = base64.b64encode(raw)
+            shm.buf[pos:pos + len(encoded)] = encoded
+        pos += len(encoded)
+        shm.buf[pos:pos + 2] = b'"}'
+        name = shm.name
+        shm.close()
+        return name, size
+    except Exception as e:
+        return None, json.dumps(dict(status="ERROR", data=error_message(e)))
+
+
+def decode_upload(filename, shm_name, length, trace_id=None):
+    """Worker: decode an UPLOAD payload that the parent placed in shared memory"""
+    with tracer.request("UPLOAD", trace_id, flow=False):
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                with tracer.span("decode"):
+                    raw = base64.b64decode(shm.buf[:length])
+            finally:
+                shm.close()
+            with tracer.span("write"), fp.file.storage.open_write(filename) as f:
+                f.write(raw)
+            return json.dumps(dict(status="OK", data="File uploaded"))
+        except Exception as e:
+            return json.dumps(dict(status="ERROR", data=error_message(e)))
+
+
+class Connection:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.inbuf = bytearray()
+        self.outq = deque()
+        self.busy = False
+        self.closed = False
+        self.eof = False  # client half-closed: finish what it sent, then close
+        self.request = None  # (cmd, file, size) and start time while recording
+
+
+class Server:
+    """Single event loop for all sockets; only large GET/UPLOAD payloads go to the process pool"""
+
+    def __init__(self, ipaddress="0.0.0.0", port=6667, pool_size=5, threshold=OFFLOAD_THRESHOLD, sock_config=None):
+        self.ipinfo = (ipaddress, port)
+        self.sock_config = sock_config or SocketConfig.from_env()
+        self.pool_size = pool_size
+        self.threshold = threshold
+        # start the tracker before the workers fork so they all share it
+        resource_tracker.ensure_running()
+        # workers come from a fork server: a worker forked from this process would
+        # inherit every open client socket, and a closed connection would never see EOF
+        context = multiprocessing.get_context("forkserver") if "forkserver" in multiprocessing.get_all_start_methods() else None
+        self.process_pool = ProcessPoolExecutor(max_workers=pool_size, mp_context=context)
+        self.selector = selectors.DefaultSelector()
+        self.completed = queue.SimpleQueue()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        resource_stats.register_provider("loop", self.loop_stats)
+
+    def loop_stats(self):
+        # STATS is answered inline, so this runs on the event loop thread
+        conns = [key.data for key in self.selector.get_map().values() if isinstance(key.data, Connection)]
+        return dict(
+            connections=len(conns),
+            offloaded=sum(1 for c in conns if c.busy),
+            queued_bytes=sum(len(view) for c in conns for view, _ in c.outq),
+        )
+
+    def start(self):
+        logging.warning(f"Hybrid server running at {self.ipinfo} with pool size {self.pool_size}")
+        self.my_socket.bind(self.ipinfo)
+        self.sock_config.listen(self.my_socket)
+        self.my_socket.setblocking(False)
+        self.selector.register(self.my_socket, selectors.EVENT_READ, "accept")
+        self.selector.register(self.wake_r, selectors.EVENT_READ, "wake")
+
+        try:
+            while True:
+                for key, mask in self.selector.select():
+                    if key.data == "accept":
+                        self.accept()
+                    elif key.data == "wake":
+                        self.drain_completed()
+                    else:
+                        conn = key.data
+                        if mask & selectors.EVENT_READ:
+                            self.read(conn)
+                        if mask & selectors.EVENT_WRITE and not conn.closed:
+                            self.write(conn)
+        except KeyboardInterrupt:
+            logging.warning("Shutting down server...")
+        finally:
+            self.process_pool.shutdown()
+            self.selector.close()
+            self.my_socket.close()
+
+    def accept(self):
+        sock, client_address = self.my_socket.accept()
+        logging.warning("Connection from %s", client_address, extra={"event": "connect"})
+        self.sock_config.apply(sock)
+        sock.setblocking(False)
+        conn = Connection(sock, client_address)
+        self.selector.register(sock, selectors.EVENT_READ, conn)
+
+    def read(self, conn):
+        try:
+            data = conn.sock.recv(self.sock_config.recv_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logging.error(f"Error handling client {conn.address}: {str(e)}")
+            self.close(conn)
+            return
+        if not data:
+            # the client may still be waiting for responses to what it already sent
+            conn.eof = True
+        else:
+            conn.inbuf += data
+        self.process(conn)
+
+    def process(self, conn):
+        # one command in flight per connection so responses keep their order
+        while not conn.busy and not conn.closed:
+            end = conn.inbuf.find(b"\r\n\r\n")
+            if end < 0:
+                break
+            command = bytes(conn.inbuf[:end])
+            del conn.inbuf[:end + 4]
+            self.dispatch(conn, command)
+        self.update_interest(conn)
+
+    def dispatch(self, conn, command):
+        logging.warning("Received: %s...", command[:50], extra={"event": "command"})
+        trace_id, command = split_trace(command)
+        if recorder.enabled:
+            conn.request = (recorder.describe(command, fp.file.storage), time.time())
+        with tracer.request(command, trace_id, conn=f"{conn.address[0]}:{conn.address[1]}") as trace_id:
+            self.dispatch_command(conn, command, trace_id)
+
+    def dispatch_command(self, conn, command, trace_id):
+        verb, _, rest = command.partition(b" ")
+        verb = verb.strip().lower()
+
+        if verb in (b"get", b"getif"):
+            params = rest.decode().split(" ")
+            try:
+                st = fp.file.storage.stat(params[0])
+                large = st.st_size >= self.threshold
+                # an unchanged file is answered inline with NOT_MODIFIED
+                if verb == b"getif" and params[1:2] == [fp.file.etag(st)]:
+                    large = False
+            except OSError:
+                large = False
+            if large:
+                conn.busy = True
+                future = self.process_pool.submit(encode_get, params[0], verb == b"getif", trace_id)
+                future.add_done_callback(lambda f: self.complete(conn, "get", f))
+                return
+        elif verb == b"upload" and len(rest) >= self.threshold:
+            filename, _, payload = rest.partition(b" ")
+            shm = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+            shm.buf[:len(payload)] = payload
+            conn.busy = True
+            future = self.process_pool.submit(decode_upload, filename.decode(), shm.name, len(payload), trace_id)
+            future.add_done_callback(lambda f: self.complete(conn, "upload", f, shm))
+            return
+
+        hasil = fp.proses_string(command.decode())
+        self.queue_response(conn, (hasil + "\r\n\r\n").encode())
+        self.record(conn, len(hasil), hasil.startswith(('{"status": "OK"', '{"status": "NOT_MODIFIED"')))
+
+    def record(self, conn, resp_bytes, ok):
+        # latency up to the moment the response is queued on the connection
+        if conn.request is not None:
+            request, started = conn.request
+            conn.request = None
+            recorder.write(request, started, resp_bytes, ok)
+
+    def complete(self, conn, kind, future, shm=None):
+        # runs on the pool's management thread; hand the result to the event loop
+        self.completed.put((conn, kind, future, shm))
+        try:
+            self.wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def drain_completed(self):
+        try:
+            while self.wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while not self.completed.empty():
+            conn, kind, future, shm = self.completed.get()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            try:
+                result = future.result()
+            except Exception as e:
+                error = json.dumps(dict(status="ERROR", data=str(e)))
+                result = (None, error) if kind == "get" else error
+            conn.busy = False
+            if conn.closed:
+                if kind == "get" and result[0] is not None:
+                    self.release_segment(result[0])
+                continue
+            if kind == "get":
+                name, size = result
+                if name is None:
+                    self.queue_response(conn, (size + "\r\n\r\n").encode())
+                    self.record(conn, len(size), False)
+                else:
+                    seg = shared_memory.SharedMemory(name=name)
+                    conn.outq.append((seg.buf[:size], seg))
+                    conn.outq.append((memoryview(b"\r\n\r\n"), None))
+                    self.record(conn, size, True)
+            else:
+                self.queue_response(conn, (result + "\r\n\r\n").encode())
+                self.record(conn, len(result), result.startswith('{"status": "OK"'))
+            self.process(conn)
+
+    def release_segment(self, name):
+        seg = shared_memory.SharedMemory(name=name)
+        seg.close()
+        seg.unlink()
+
+    def queue_response(self, conn, data):
+        conn.outq.append((memoryview(data), None))
+
+    def write(self, conn):
+        while conn.outq:
+            view, seg = conn.outq[0]
+            try:
+                sent = conn.sock.send(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logging.error(f"Error handling client {conn.address}: {str(e)}")
+                self.close(conn)
+                return
+            if sent < len(view):
+                conn.outq[0] = (view[sent:], seg)
+                break
+            conn.outq.popleft()
+            view.release()
+            if seg is not None:
+                seg.close()
+                seg.unlink()
+        self.update_interest(conn)
+
+    def update_interest(self, conn):
+        if conn.closed:
+            return
+        if conn.eof and not conn.busy and not conn.outq and conn.inbuf.find(b"\r\n\r\n") < 0:
+            self.close(conn)
+            return
+        events = 0 if conn.eof else selectors.EVENT_READ
+        if conn.outq:
+            events |= selectors.EVENT_WRITE
+        registered = conn.sock in self.selector.get_map()
+        if not events:
+            # half-closed and waiting for the pool; drain_completed picks it up again
+            if registered:
+                self.selector.unregister(conn.sock)
+        elif registered:
+            self.selector.modify(conn.sock, events, conn)
+        else:
+            self.selector.register(conn.sock, events, conn)
+
+    def close(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        if conn.sock in self.selector.get_map():
+            self.selector.unregister(conn.sock)
+        conn.sock.close()
+        while conn.outq:
+            view, seg = conn.outq.popleft()
+            view.release()
+            if seg is not None:
+                seg.close()
+                seg.unlink()
+        logging.warning("Connection closed for %s", conn.address, extra={"event": "close"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pool_size", type=int, nargs="?", default=5, help="Process pool size for heavy payloads")
+    parser.add_argument("--port", type=int, default=6667, help="Port to listen on")
+    parser.add_argument("--threshold", type=int, default=OFFLOAD_THRESHOLD, help="Offload payloads at or above this many bytes")
+    args = parser.parse_args()
+
+    setup_from_env()
+    resource_stats.start_tracemalloc_from_env()
+    server = Server(ipaddress="0.0.0.0", port=args.port, pool_size=args.pool_size, threshold=args.threshold)
+    server.start()
@@ -1,34 +1,43 @@
 from socket import *
 import socket
 import logging
-import sys
+import argparse
 from concurrent.futures import ProcessPoolExecutor
 from file_protocol import FileProtocol
+from socket_config import SocketConfig
+from log_config import setup_from_env
+from tracing import tracer, split_trace
+import resource_stats
 from multiprocessing import Manager
 
+sock_config = SocketConfig.from_env()
+
 def init_worker():
     global fp
     fp = FileProtocol()
+    # the parent's log writer thread doesn't exist in a forked worker
+    setup_from_env()
+    resource_stats.start_tracemalloc_from_env()
 
 def handle_client(connection, client_address):
     buffer = ""
     try:
         while True:
-            data = connection.recv(1024 * 1024)  # 64KB buffer
+            data = connection.recv(sock_config.recv_size)
             if not data:
                 break
             buffer += data.decode()
             while "\r\n\r\n" in buffer:
                 command_str, buffer = buffer.split("\r\n\r\n", 1)
-                logging.warning(f"Received: {command_str[:50]}...")  # Log first 50 chars
-                hasil = fp.proses_string(command_str)
-                response = hasil + "\r\n\r\n"
-                connection.sendall(response.encode())
+                logging.warning("Received: %s...", command_str[:50], extra={"event": "command"})  # Log first 50 chars
+                trace_id, command_str = split_trace(command_str)
+                with tracer.request(command_str, trace_id, conn=f"{client_address[0]}:{client_address[1]}"):
+                    sock_config.send_chunks(connection, tracer.send_spans(fp.proses_string_stream(command_str)))
     except Exception as e:
         logging.error(f"Error handling client {client_address}: {str(e)}")
     finally:
         connection.close()
-        logging.warning(f"Connection closed for {client_address}")
+        logging.warning("Connection closed for %s", client_address, extra={"event": "close"})
 
 class Server:
     def __init__(self, ipaddress="0.0.0.0", port=6667, pool_size=5):
@@ -44,12 +53,13 @@ class Server:
     def start(self):
         logging.warning(f"ProcessPool server running at {self.ipinfo} with pool size {self.pool_size}")
         self.my_socket.bind(self.ipinfo)
-        self.my_socket.listen(100)
-        
+        sock_config.listen(self.my_socket)
+
         try:
             while True:
                 connection, client_address = self.my_socket.accept()
-                logging.warning(f"Connection from {client_address}")
+                logging.warning("Connection from %s", client_address, extra={"event": "connect"})
+                sock_config.apply(connection)
                 self.process_pool.submit(handle_client, connection, client_address)
         except KeyboardInterrupt:
             logging.warning("Shutting down server...")
@@ -58,7 +68,11 @@ class Server:
             self.my_socket.close()
 
 if __name__ == "__main__":
-    pool_size = int(sys.argv[1]) if len(sys.argv) > 1 else 5
-    logging.basicConfig(level=logging.WARNING)
-    server = Server(ipaddress="0.0.0.0", port=6667, pool_size=pool_size)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pool_size", type=int, nargs="?", default=5, help="Number of worker processes")
+    parser.add_argument("--port", type=int, default=6667, help="Port to listen on")
+    args = parser.parse_args()
+
+    setup_from_env()
+    server = Server(ipaddress="0.0.0.0", port=args.port, pool_size=args.pool_size)
     server.start()
\ No newline at end of file
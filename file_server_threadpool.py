@@ -1,61 +1,268 @@
 from socket import *
 import socket
+import os
 import threading
+import selectors
 import logging
-import sys
+import argparse
+import queue
+import re
 from concurrent.futures import ThreadPoolExecutor
+from adaptive_pool import AdaptiveThreadPoolExecutor
 from file_protocol import FileProtocol
+from socket_config import SocketConfig
+from log_config import setup_from_env
+from tracing import tracer, split_trace
+import resource_stats
+
+"""
+* opsional, request dibagi ke dua lane: command kontrol (LIST, LISTMETA,
+  DELETE, STATS) dijalankan di pool kontrol kecil tersendiri, transfer besar
+  (GET, GETIF, UPLOAD) di pool utama, sehingga LIST tidak menunggu transfer
+  100 MB selesai
+  python3 file_server_threadpool.py 5 --control-workers 2
+  pool_size tetap jumlah worker transfer; server memakai pool_size +
+  control_workers thread, jadi catat control_workers saat membandingkan hasil
+  benchmark. Default 0: mode lama (satu worker per koneksi, tanpa lane)
+
+* koneksi yang idle tidak memegang worker: koneksi menunggu di selector
+  dan baru diberikan ke lane kontrol saat ada data masuk
+
+* kedalaman antrian kedua lane terlihat di STATS (lanes)
+
+* --unix-socket PATH: server juga listen di Unix domain socket untuk client
+  di mesin yang sama; lewat socket ini GETFD mengirim file descriptor
+  (SCM_RIGHTS) sehingga isi file tidak lewat socket (lihat file_client_local.py)
+"""
 
 fp = FileProtocol()
 
+BULK_COMMANDS = ("GET", "GETIF", "UPLOAD")
+# the verb must show up within this many characters, otherwise the command is treated as control
+LANE_HEAD = 256
+
+
+def lane_of(buffer):
+    """'bulk' or 'control' for the command at the start of buffer, None while its verb is incomplete"""
+    _, command = split_trace(buffer[:LANE_HEAD])
+    match = re.match(r"\s*(\S+)\s", command)
+    if match:
+        return "bulk" if match.group(1).upper() in BULK_COMMANDS else "control"
+    if "\r\n\r\n" in buffer or len(buffer) >= LANE_HEAD:
+        return "control"
+    return None
+
+
+class Parking:
+    """
+    Idle connections wait here instead of holding a worker; a selector
+    thread hands a connection to on_readable once it has data to read.
+    """
+
+    def __init__(self, on_readable):
+        self.on_readable = on_readable
+        self.selector = selectors.DefaultSelector()
+        self.pending = queue.SimpleQueue()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.run, name="parking", daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.selector.get_map()) - 1
+
+    def park(self, connection, client_address, buffer):
+        # registering happens on the selector thread; other threads only queue and wake it
+        self.pending.put((connection, client_address, buffer))
+        self.wake_w.send(b"\0")
+
+    def run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.wake_r:
+                    self.wake_r.recv(4096)
+                    while not self.pending.empty():
+                        connection, client_address, buffer = self.pending.get()
+                        self.selector.register(connection, selectors.EVENT_READ, (client_address, buffer))
+                else:
+                    self.selector.unregister(key.fileobj)
+                    client_address, buffer = key.data
+                    self.on_readable(key.fileobj, client_address, buffer)
+
+
 class Server:
-    def __init__(self, ipaddress="0.0.0.0", port=6667, pool_size=5):
+    def __init__(self, ipaddress="0.0.0.0", port=6667, pool_size=5, adaptive=False, min_workers=2, max_workers=50,
+                 control_workers=0, unix_socket=None, sock_config=None):
         self.ipinfo = (ipaddress, port)
-        self.pool_size = pool_size
-        self.thread_pool = ThreadPoolExecutor(max_workers=pool_size)
+        self.unix_socket = unix_socket
+        self.sock_config = sock_config or SocketConfig.from_env()
+        self.adaptive = adaptive
+        if adaptive:
+            self.pool_size = f"adaptive {min_workers}-{max_workers}"
+            self.thread_pool = AdaptiveThreadPoolExecutor(min_workers=min_workers, max_workers=max_workers)
+        else:
+            self.pool_size = pool_size
+            self.thread_pool = ThreadPoolExecutor(max_workers=pool_size)
+        resource_stats.register_provider("pool", self.pool_stats)
+        self.control_workers = control_workers
+        if control_workers:
+            self.control_pool = ThreadPoolExecutor(max_workers=control_workers, thread_name_prefix="control")
+            self.lanes = dict(control=self.control_pool, bulk=self.thread_pool)
+            self.parking = Parking(self.on_readable)
+            resource_stats.register_provider("lanes", self.lane_stats)
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
+    def pool_stats(self):
+        if self.adaptive:
+            return self.thread_pool.stats()
+        return dict(workers=len(self.thread_pool._threads), queued=self.thread_pool._work_queue.qsize())
+
+    def lane_stats(self):
+        return dict(
+            control=dict(workers=len(self.control_pool._threads), queued=self.control_pool._work_queue.qsize()),
+            bulk=self.pool_stats(),
+            parked=len(self.parking),
+        )
+
     def start(self):
-        logging.warning(f"ThreadPool server running at {self.ipinfo} with pool size {self.pool_size}")
+        lanes = f", {self.control_workers} control worker(s)" if self.control_workers else ""
+        logging.warning(f"ThreadPool server running at {self.ipinfo} with pool size {self.pool_size}{lanes}")
         self.my_socket.bind(self.ipinfo)
-        self.my_socket.listen(100)
-        
+        self.sock_config.listen(self.my_socket)
+        if self.unix_socket:
+            self.start_unix()
+
         try:
-            while True:
-                connection, client_address = self.my_socket.accept()
-                logging.warning(f"Connection from {client_address}")
-                self.thread_pool.submit(self.handle_client, connection, client_address)
+            self.accept_loop(self.my_socket)
         except KeyboardInterrupt:
             logging.warning("Shutting down server...")
         finally:
             self.thread_pool.shutdown()
+            if self.control_workers:
+                self.control_pool.shutdown()
             self.my_socket.close()
+            if self.unix_socket:
+                os.unlink(self.unix_socket)
+
+    def start_unix(self):
+        if os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)  # left behind by a previous run
+        self.unix_listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.unix_listener.bind(self.unix_socket)
+        self.unix_listener.listen(self.sock_config.backlog)
+        logging.warning(f"Also listening on Unix socket {self.unix_socket}")
+        threading.Thread(target=self.accept_loop, args=(self.unix_listener,), name="unix-accept", daemon=True).start()
+
+    def accept_loop(self, listener):
+        while True:
+            connection, client_address = listener.accept()
+            if connection.family == socket.AF_UNIX:
+                client_address = ("unix", connection.fileno())  # peers of a Unix socket are unnamed
+            else:
+                self.sock_config.apply(connection)
+            logging.warning("Connection from %s", client_address, extra={"event": "connect"})
+            if self.control_workers:
+                self.parking.park(connection, client_address, "")
+            else:
+                self.thread_pool.submit(self.handle_client, connection, client_address)
+
+    def on_readable(self, connection, client_address, buffer):
+        self.control_pool.submit(self.serve, connection, client_address, buffer, "control", True)
+
+    def serve(self, connection, client_address, buffer, lane, receive=False):
+        """
+        Serve the commands in buffer that belong to this lane. A command for
+        the other lane hands the connection over to it; without a complete
+        command the connection is parked again, except while a bulk command
+        (an UPLOAD body) is still arriving, which is read on the bulk lane.
+        """
+        try:
+            while True:
+                if receive:
+                    data = connection.recv(self.sock_config.recv_size)
+                    if not data:
+                        self.close(connection, client_address)
+                        return
+                    buffer += data.decode()
+                complete = "\r\n\r\n" in buffer
+                target = lane_of(buffer)
+                if not complete and target != "bulk":
+                    self.parking.park(connection, client_address, buffer)
+                    return
+                if target != lane:
+                    self.lanes[target].submit(self.serve, connection, client_address, buffer, target)
+                    return
+                receive = not complete
+                if complete:
+                    command_str, buffer = buffer.split("\r\n\r\n", 1)
+                    self.execute(connection, client_address, command_str, lane=lane)
+        except Exception as e:
+            logging.error(f"Error handling client {client_address}: {str(e)}")
+            self.close(connection, client_address)
+
+    def execute(self, connection, client_address, command_str, **args):
+        logging.warning("Received: %s...", command_str[:50], extra={"event": "command"})  # Log first 50 chars
+        trace_id, command_str = split_trace(command_str)
+        with tracer.request(command_str, trace_id, conn=f"{client_address[0]}:{client_address[1]}", **args):
+            if connection.family == socket.AF_UNIX and command_str[:6].upper() == "GETFD ":
+                self.send_fd(connection, command_str)
+            else:
+                self.sock_config.send_chunks(connection, tracer.send_spans(fp.proses_string_stream(command_str)))
+
+    def send_fd(self, connection, command_str):
+        """Header and the descriptor of the opened file in one message; the client reads the file itself"""
+        header, f = fp.proses_getfd(command_str)
+        try:
+            with tracer.span("send"):
+                socket.send_fds(connection, [header], [f.fileno()] if f else [])
+        finally:
+            if f:
+                f.close()
+
+    def close(self, connection, client_address):
+        connection.close()
+        logging.warning("Connection closed for %s", client_address, extra={"event": "close"})
 
     def handle_client(self, connection, client_address):
         buffer = ""
         try:
             while True:
-                data = connection.recv(1024 * 1024)  # 64KB buffer
+                data = connection.recv(self.sock_config.recv_size)
                 if not data:
                     break
                 buffer += data.decode()
                 while "\r\n\r\n" in buffer:
                     command_str, buffer = buffer.split("\r\n\r\n", 1)
-                    # logging.warning(f"{buffer}")
-                    logging.warning(f"Received: {command_str[:50]}...")  # Log first 50 chars
-                    hasil = fp.proses_string(command_str)
-                    #logging.warning(hasil)
-                    response = hasil + "\r\n\r\n"
-                    connection.sendall(response.encode())
+                    self.execute(connection, client_address, command_str)
         except Exception as e:
             logging.error(f"Error handling client {client_address}: {str(e)}")
         finally:
-            connection.close()
-            logging.warning(f"Connection closed for {client_address}")
+            self.close(connection, client_address)
 
 if __name__ == "__main__":
-    pool_size = int(sys.argv[1]) if len(sys.argv) > 1 else 5
-    logging.basicConfig(level=logging.WARNING)
-    server = Server(ipaddress="0.0.0.0", port=6667, pool_size=pool_size)
-    server.start()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pool_size", type=int, nargs="?", default=5, help="Fixed pool size")
+    parser.add_argument("--port", type=int, default=6667, help="Port to listen on")
+    parser.add_argument("--adaptive", action="store_true", help="Grow/shrink the pool based on load")
+    parser.add_argument("--min-workers", type=int, default=2, help="Lower bound for adaptive mode")
+    parser.add_argument("--max-workers", type=int, default=50, help="Upper bound for adaptive mode")
+    parser.add_argument("--control-workers", type=int, default=0,
+                        help="Extra workers reserved for LIST/LISTMETA/DELETE/STATS (0 = one worker per connection, no lanes)")
+    parser.add_argument("--unix-socket", metavar="PATH", help="Also listen on this Unix domain socket (enables GETFD)")
+    args = parser.parse_args()
+
+    setup_from_env()
+    resource_stats.start_tracemalloc_from_env()
+    server = Server(
+        ipaddress="0.0.0.0",
+        port=args.port,
+        pool_size=args.pool_size,
+        adaptive=args.adaptive,
+        min_workers=args.min_workers,
+        max_workers=args.max_workers,
+        control_workers=args.control_workers,
+        unix_socket=args.unix_socket,
+    )
+    server.start()
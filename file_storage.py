@@ -0,0 +1,129 @@
+import os
+import shutil
+import hashlib
+import logging
+import argparse
+from fnmatch import fnmatch
+
+"""
+* storage backend menentukan di mana sebuah nama file disimpan di disk
+
+* FlatStorage  : semua file di satu direktori (perilaku lama, files/)
+* ShardedStorage : file disebar ke subdirektori berprefix hash, dan
+  opsional ke beberapa root (misal beberapa disk)
+
+* semua operasi memakai path absolut, tidak ada os.chdir
+"""
+
+
+class FlatStorage:
+    def __init__(self, root="files"):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, filename):
+        return os.path.join(self.root, filename)
+
+    def list(self, pattern="*.*"):
+        return [
+            entry.name for entry in os.scandir(self.root)
+            if entry.is_file() and not entry.name.startswith(".") and fnmatch(entry.name, pattern)
+        ]
+
+    def open_read(self, filename):
+        return open(self.path(filename), "rb")
+
+    def open_write(self, filename):
+        path = self.path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, "wb")
+
+    def remove(self, filename):
+        os.remove(self.path(filename))
+
+    def stat(self, filename):
+        return os.stat(self.path(filename))
+
+
+class ShardedStorage(FlatStorage):
+    """files/ab/cd/<filename>, with ab/cd taken from the md5 of the filename"""
+
+    def __init__(self, roots=("files",), depth=2, width=2):
+        self.roots = [os.path.abspath(r) for r in roots]
+        for r in self.roots:
+            os.makedirs(r, exist_ok=True)
+        self.depth = depth
+        self.width = width
+        self.root = self.roots[0]
+
+    def path(self, filename):
+        digest = hashlib.md5(filename.encode()).hexdigest()
+        root = self.roots[int(digest[-8:], 16) % len(self.roots)]
+        parts = [digest[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return os.path.join(root, *parts, filename)
+
+    def list(self, pattern="*.*"):
+        filelist = []
+        for root in self.roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                rel = os.path.relpath(dirpath, root)
+                depth = 0 if rel == "." else rel.count(os.sep) + 1
+                if depth == self.depth:
+                    dirnames.clear()
+                    filelist.extend(f for f in filenames if not f.startswith(".") and fnmatch(f, pattern))
+        return filelist
+
+
+def error_message(e):
+    """str(e) naming only the file, so error responses don't reveal the storage paths on the server"""
+    if isinstance(e, OSError) and e.filename:
+        return str(type(e)(e.errno, e.strerror, os.path.basename(e.filename)))
+    return str(e)
+
+
+def storage_from_env():
+    """
+    FILE_STORAGE=flat|sharded (default flat)
+    FILE_STORAGE_ROOTS=/disk1/files:/disk2/files (default files)
+    FILE_STORAGE_DEPTH=2
+    """
+    kind = os.environ.get("FILE_STORAGE", "flat")
+    roots = os.environ.get("FILE_STORAGE_ROOTS", "files").split(os.pathsep)
+    if kind == "sharded":
+        depth = int(os.environ.get("FILE_STORAGE_DEPTH", "2"))
+        return ShardedStorage(roots, depth=depth)
+    return FlatStorage(roots[0])
+
+
+def migrate(source, storage, move=False):
+    """Copy (or move) every file of a flat directory into the given storage layout"""
+    source = os.path.abspath(source)
+    count = 0
+    for entry in os.scandir(source):
+        if not entry.is_file():
+            continue
+        dest = storage.path(entry.name)
+        if os.path.abspath(dest) == entry.path:
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if move:
+            shutil.move(entry.path, dest)
+        else:
+            shutil.copy2(entry.path, dest)
+        logging.warning(f"{'moved' if move else 'copied'} {entry.name} -> {dest}")
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate a flat files/ directory into the sharded layout")
+    parser.add_argument("--source", default="files", help="Flat directory to migrate")
+    parser.add_argument("--roots", default="files", help=f"Sharded root path(s), separated by '{os.pathsep}'")
+    parser.add_argument("--depth", type=int, default=2, help="Number of hash-prefix directory levels")
+    parser.add_argument("--move", action="store_true", help="Move instead of copy")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    storage = ShardedStorage(args.roots.split(os.pathsep), depth=args.depth)
+    total = migrate(args.source, storage, move=args.move)
+    print(f"{total} file(s) migrated")
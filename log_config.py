@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+import logging.handlers
+
+"""
+* konfigurasi logging untuk server, dipilih lewat environment:
+  FILE_LOG_MODE       : async (default) | sync | off (hanya ERROR ke atas, langsung ke stderr)
+  FILE_LOG_SAMPLE     : sampling per event, misal "connect=0.1,command=0.01"
+  FILE_LOG_RATE_LIMIT : maksimum record per detik untuk tiap event (0 = tanpa batas)
+  FILE_LOG_MAX_LEN    : argumen/pesan lebih panjang dari ini dipotong
+
+* mode async: handler di thread request hanya memasukkan record ke queue,
+  penulisan ke stderr dilakukan oleh QueueListener di thread terpisah
+
+* event ditandai dengan extra={"event": "..."}; record ERROR ke atas
+  selalu lolos sampling dan rate limit
+"""
+
+
+class EventFilter(logging.Filter):
+    def __init__(self, sample_rates=None, rate_limit=0, max_len=200):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limit = rate_limit
+        self.max_len = max_len
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.ERROR:
+            event = getattr(record, "event", None)
+            rate = self.sample_rates.get(event, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+            if self.rate_limit and not self.take_token(event):
+                return False
+        self.truncate(record)
+        return True
+
+    def take_token(self, event):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(event, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+            if tokens < 1:
+                self.buckets[event] = (tokens, now)
+                return False
+            self.buckets[event] = (tokens - 1, now)
+            return True
+
+    def truncate(self, record):
+        # potong argumen sebelum diformat agar payload besar tidak pernah disalin utuh
+        if self.max_len:
+            if isinstance(record.args, tuple):
+                record.args = tuple(self.cut(a) for a in record.args)
+            elif not record.args:
+                record.msg = self.cut(record.msg)
+        return record
+
+    def cut(self, value):
+        if isinstance(value, (str, bytes)) and len(value) > self.max_len:
+            return value[:self.max_len] + (f"... [{len(value)} chars]" if isinstance(value, str) else b"...")
+        return value
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in filter(None, (value or "").split(",")):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+
+_listener = None
+_listener_pid = None
+
+
+def stop_listener():
+    """Flush and stop the background writer of this process, if any"""
+    global _listener
+    # a listener inherited through fork has no thread in this process
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+def setup_logging(mode="async", level=logging.WARNING, sample_rates=None, rate_limit=0, max_len=200):
+    """Configure the root logger; returns the QueueListener in async mode"""
+    global _listener, _listener_pid
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    stop_listener()
+
+    # off drops the per-request chatter (WARNING and below) but still reports errors
+    logging.disable(logging.WARNING if mode == "off" else logging.NOTSET)
+    root.setLevel(level)
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    event_filter = EventFilter(sample_rates, rate_limit, max_len)
+
+    if mode in ("sync", "off"):
+        stream.addFilter(event_filter)
+        root.addHandler(stream)
+        return None
+
+    handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    handler.addFilter(event_filter)
+    root.addHandler(handler)
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener_pid = os.getpid()
+    _listener.start()
+    return _listener
+
+
+atexit.register(stop_listener)
+
+
+def setup_from_env(level=logging.WARNING):
+    return setup_logging(
+        mode=os.environ.get("FILE_LOG_MODE", "async"),
+        level=level,
+        sample_rates=parse_sample_rates(os.environ.get("FILE_LOG_SAMPLE")),
+        rate_limit=float(os.environ.get("FILE_LOG_RATE_LIMIT", 0)),
+        max_len=int(os.environ.get("FILE_LOG_MAX_LEN", 200)),
+    )
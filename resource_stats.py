@@ -0,0 +1,71 @@
+import os
+import threading
+import tracemalloc
+
+"""
+* statistik sumber daya proses server, dikirim lewat command STATS
+  (RSS, jumlah thread, jumlah file descriptor)
+
+* FILE_TRACEMALLOC=<jumlah frame> menyalakan tracemalloc sehingga STATS
+  juga berisi lokasi alokasi memori terbesar
+
+* server bisa menambah statistiknya sendiri (jumlah client, antrian pool, ...)
+  dengan register_provider(nama, fungsi)
+"""
+
+_providers = {}
+
+
+def register_provider(name, fn):
+    """fn() is called on every STATS request; its (JSON-serialisable) result is reported under name"""
+    _providers[name] = fn
+
+
+def unregister_provider(name):
+    _providers.pop(name, None)
+
+
+def start_tracemalloc_from_env():
+    frames = int(os.environ.get("FILE_TRACEMALLOC", 0))
+    if frames and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def process_stats():
+    stats = dict(pid=os.getpid(), threads=threading.active_count())
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    stats["rss_kb"] = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+        stats["fds"] = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        pass  # no procfs (e.g. macOS); only the python thread count is known
+    return stats
+
+
+def tracemalloc_stats(limit=10):
+    current, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+    return dict(
+        current_kb=current // 1024,
+        peak_kb=peak // 1024,
+        top=[
+            dict(location=f"{s.traceback[0].filename}:{s.traceback[0].lineno}", size_kb=s.size // 1024, count=s.count)
+            for s in top
+        ],
+    )
+
+
+def snapshot(limit=10):
+    data = dict(process=process_stats())
+    if tracemalloc.is_tracing():
+        data["tracemalloc"] = tracemalloc_stats(limit)
+    for name, fn in list(_providers.items()):
+        try:
+            data[name] = fn()
+        except Exception as e:
+            data[name] = f"error: {e}"
+    return data
@@ -0,0 +1,334 @@
+import os
+import sys
+import csv
+import time
+import json
+import base64
+import random
+import shutil
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from file_client_threadpool import FileClient
+from socket_config import free_port, wait_for_port
+
+"""
+* soak test: menjalankan workload campuran (LIST/GET/UPLOAD/DELETE) selama
+  berjam-jam terhadap tiap varian server, sambil mencatat RSS, jumlah thread,
+  jumlah fd (proses server + semua child-nya) setiap interval
+
+* dengan --tracemalloc server dijalankan dengan FILE_TRACEMALLOC sehingga
+  lokasi alokasi terbesar bisa dibandingkan antara awal dan akhir run
+
+* di akhir run setiap metrik diperiksa: jika terus naik (slope positif,
+  sebagian besar sampel naik, dan total kenaikan melewati batas) ditandai
+  sebagai GROWTH pada laporan
+"""
+
+VARIANTS = {
+    "file_server": ["file_server.py", "--port", "{port}"],
+    "threadpool": ["file_server_threadpool.py", "{pool}", "--port", "{port}"],
+    "processpool": ["file_server_processpool.py", "{pool}", "--port", "{port}"],
+    "hybrid": ["file_server_hybrid.py", "{pool}", "--port", "{port}"],
+}
+
+METRICS = ["rss_kb", "threads", "fds", "procs"]
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        op, _, weight = item.partition("=")
+        mix[op.strip()] = float(weight)
+    return mix
+
+
+def process_tree(pid):
+    """pid plus all of its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces; ppid is the 2nd field after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+
+def sample_process(pid):
+    stats = dict(rss_kb=0, threads=0, fds=0)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    stats["rss_kb"] = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+        stats["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return None  # exited between listing and reading
+    return stats
+
+
+def detect_growth(times, values, warmup=0.1, min_growth=0.05, min_rising=0.6):
+    """
+    Least-squares slope (per hour) after the warmup part of the run, the share
+    of sample-to-sample changes that went up, and the relative growth between
+    the start and the end. All three must point up for the metric to be flagged.
+    """
+    skip = int(len(values) * warmup)
+    times, values = times[skip:], values[skip:]
+    if len(values) < 5:
+        return dict(slope_per_hour=0.0, rising=0.0, growth_pct=0.0, flagged=False)
+    mean_t = sum(times) / len(times)
+    mean_v = sum(values) / len(values)
+    var_t = sum((t - mean_t) ** 2 for t in times)
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / var_t if var_t else 0.0
+    changes = [b - a for a, b in zip(values, values[1:]) if b != a]
+    rising = sum(1 for c in changes if c > 0) / len(changes) if changes else 0.0
+    edge = max(1, len(values) // 10)
+    first = sum(values[:edge]) / edge
+    last = sum(values[-edge:]) / edge
+    growth = (last - first) / first if first else 0.0
+    return dict(
+        slope_per_hour=round(slope * 3600, 2),
+        rising=round(rising, 2),
+        growth_pct=round(growth * 100, 2),
+        flagged=slope > 0 and rising >= min_rising and growth >= min_growth,
+    )
+
+
+class Workload:
+    """Mixed client traffic from several threads until stop() is called"""
+
+    def __init__(self, client, workers=8, mix=None, sizes_kb=(10, 100, 1024), seed_files=5):
+        self.client = client
+        self.workers = workers
+        self.mix = mix or dict(list=4, get=4, upload=1, delete=1)
+        self.sizes = [kb * 1024 for kb in sizes_kb]
+        self.seed_names = [f"soak_seed_{i}.dat" for i in range(seed_files)]
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = dict(requests=0, errors=0)
+        self.threads = []
+
+    def upload(self, name, size):
+        encoded = base64.b64encode(os.urandom(size)).decode()
+        return self.client.send_command(f"UPLOAD {name} {encoded}")
+
+    def start(self):
+        for i, name in enumerate(self.seed_names):
+            self.upload(name, self.sizes[i % len(self.sizes)])
+        for i in range(self.workers):
+            t = threading.Thread(target=self.run, args=(i,), daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def run(self, worker_id):
+        rng = random.Random(worker_id)
+        ops, weights = list(self.mix), list(self.mix.values())
+        mine = []
+        counter = 0
+        while not self.stop_event.is_set():
+            op = rng.choices(ops, weights)[0]
+            if op == "list":
+                result = self.client.send_command("LIST")
+            elif op == "get":
+                result = self.client.send_command(f"GET {rng.choice(self.seed_names)}")
+            elif op == "upload" or not mine:
+                counter += 1
+                name = f"soak_{worker_id}_{counter}.dat"
+                result = self.upload(name, rng.choice(self.sizes))
+                mine.append(name)
+            else:
+                result = self.client.send_command(f"DELETE {mine.pop(0)}")
+            with self.lock:
+                self.counts["requests"] += 1
+                if result.get("status") != "OK":
+                    self.counts["errors"] += 1
+            # keep the number of files on the server bounded
+            while len(mine) > 5:
+                self.client.send_command(f"DELETE {mine.pop(0)}")
+
+    def stop(self):
+        self.stop_event.set()
+        for t in self.threads:
+            t.join(timeout=self.client.timeout)
+
+
+class SoakTest:
+    def __init__(self, duration=3600, interval=30, workers=8, pool_size=5, mix=None, sizes_kb=(10, 100, 1024), tracemalloc_frames=0):
+        self.duration = duration
+        self.interval = interval
+        self.workers = workers
+        self.pool_size = pool_size
+        self.mix = mix
+        self.sizes_kb = sizes_kb
+        self.tracemalloc_frames = tracemalloc_frames
+        self.samples = []
+        self.reports = []
+
+    def server_stats(self, client):
+        result = client.send_command("STATS 15")
+        return result.get("data", {}) if result.get("status") == "OK" else {}
+
+    def run_variant(self, variant):
+        port = free_port()
+        storage_dir = tempfile.mkdtemp(prefix=f"soak_{variant}_")
+        command = [arg.format(port=port, pool=self.pool_size) for arg in VARIANTS[variant]]
+        env = dict(os.environ, FILE_STORAGE="flat", FILE_STORAGE_ROOTS=storage_dir, FILE_LOG_MODE="off")
+        if self.tracemalloc_frames:
+            env["FILE_TRACEMALLOC"] = str(self.tracemalloc_frames)
+        server = subprocess.Popen(
+            [sys.executable] + command, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        print(f"\n=== {variant}: {' '.join(command)} (pid {server.pid}) for {self.duration} s ===")
+        try:
+            if not wait_for_port(port):
+                print(f"{variant} did not start")
+                return None
+            client = FileClient("127.0.0.1", port)
+            workload = Workload(client, self.workers, self.mix, self.sizes_kb)
+            workload.start()
+            start = time.time()
+            rows = []
+            first_stats = None
+            stats = {}
+            try:
+                while True:
+                    row = self.sample(variant, server.pid, start, workload)
+                    stats = self.server_stats(client)
+                    if first_stats is None:
+                        first_stats = stats
+                    row["traced_kb"] = stats.get("tracemalloc", {}).get("current_kb", "")
+                    rows.append(row)
+                    print(
+                        f"[{variant}] t={row['elapsed_s']:>7}s rss={row['rss_kb'] / 1024:8.1f} MB "
+                        f"threads={row['threads']:>4} fds={row['fds']:>5} procs={row['procs']:>3} "
+                        f"req={row['requests']} err={row['errors']}"
+                    )
+                    if server.poll() is not None:
+                        print(f"{variant} exited with code {server.returncode}")
+                        break
+                    if time.time() - start >= self.duration:
+                        break
+                    time.sleep(self.interval)
+            finally:
+                workload.stop()
+            self.samples.extend(rows)
+            report = self.analyse(variant, rows, first_stats or {}, stats)
+            self.reports.append(report)
+            return report
+        finally:
+            try:
+                os.killpg(server.pid, 9)
+            except OSError:
+                pass
+            server.wait()
+            shutil.rmtree(storage_dir, ignore_errors=True)
+
+    def sample(self, variant, pid, start, workload):
+        row = dict(
+            timestamp=datetime.now().isoformat(), variant=variant,
+            elapsed_s=round(time.time() - start, 1), rss_kb=0, threads=0, fds=0, procs=0,
+        )
+        for p in process_tree(pid):
+            stats = sample_process(p)
+            if stats is None:
+                continue
+            row["procs"] += 1
+            for key, value in stats.items():
+                row[key] += value
+        with workload.lock:
+            row.update(workload.counts)
+        return row
+
+    def analyse(self, variant, rows, first_stats, last_stats):
+        times = [r["elapsed_s"] for r in rows]
+        report = dict(variant=variant, samples=len(rows), requests=rows[-1]["requests"] if rows else 0)
+        for metric in METRICS:
+            result = detect_growth(times, [r[metric] for r in rows])
+            for key, value in result.items():
+                report[f"{metric}_{key}"] = value
+        report["allocators"] = self.allocator_growth(first_stats, last_stats)
+        return report
+
+    @staticmethod
+    def allocator_growth(first_stats, last_stats, limit=5):
+        """Source lines whose traced memory grew the most between the first and last sample"""
+        before = {a["location"]: a["size_kb"] for a in first_stats.get("tracemalloc", {}).get("top", [])}
+        after = last_stats.get("tracemalloc", {}).get("top", [])
+        growth = sorted(((a["size_kb"] - before.get(a["location"], 0), a["location"]) for a in after), reverse=True)
+        return [f"{location} +{kb} KB" for kb, location in growth[:limit] if kb > 0]
+
+    def print_report(self):
+        print("\n" + "=" * 80)
+        print("SOAK TEST REPORT")
+        print("=" * 80)
+        for report in self.reports:
+            print(f"\n{report['variant']} ({report['samples']} samples, {report['requests']} requests)")
+            for metric in METRICS:
+                flag = "GROWTH" if report[f"{metric}_flagged"] else "ok"
+                print(
+                    f"  {metric:<8} {flag:<7} slope {report[f'{metric}_slope_per_hour']:>10}/h  "
+                    f"growth {report[f'{metric}_growth_pct']:>7}%  rising {report[f'{metric}_rising']:.0%}"
+                )
+            for line in report["allocators"]:
+                print(f"  alloc    {line}")
+
+    def save_results_to_csv(self, samples_file="soak_samples.csv", report_file="soak_report.csv"):
+        if not self.samples:
+            print("No results to save")
+            return False
+        try:
+            with open(samples_file, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=list(self.samples[0].keys()))
+                writer.writeheader()
+                writer.writerows(self.samples)
+            with open(report_file, 'w', newline='') as csvfile:
+                rows = [dict(r, allocators=json.dumps(r["allocators"])) for r in self.reports]
+                writer = csv.DictWriter(csvfile, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"\nSamples saved to {samples_file}, report saved to {report_file}")
+            return True
+        except Exception as e:
+            print(f"Error saving results: {str(e)}")
+            return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Long-running mixed workload with resource growth detection")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS), help="Server variants to soak")
+    parser.add_argument("--duration", type=int, default=3600, help="Seconds per variant")
+    parser.add_argument("--interval", type=int, default=30, help="Seconds between samples")
+    parser.add_argument("--workers", type=int, default=8, help="Client threads")
+    parser.add_argument("--pool-size", type=int, default=5, help="Server pool size")
+    parser.add_argument("--mix", default="list=4,get=4,upload=1,delete=1", help="Operation weights")
+    parser.add_argument("--sizes-kb", nargs="+", type=int, default=[10, 100, 1024], help="File sizes used by GET/UPLOAD")
+    parser.add_argument("--tracemalloc", type=int, default=0, metavar="FRAMES", help="Run servers with tracemalloc (frames per trace)")
+    parser.add_argument("--output", default="soak_samples.csv", help="Samples CSV filename")
+    parser.add_argument("--report", default="soak_report.csv", help="Report CSV filename")
+    args = parser.parse_args()
+
+    soak = SoakTest(
+        args.duration, args.interval, args.workers, args.pool_size,
+        parse_mix(args.mix), args.sizes_kb, args.tracemalloc,
+    )
+    for variant in args.variants:
+        soak.run_variant(variant)
+    soak.print_report()
+    soak.save_results_to_csv(args.output, args.report)
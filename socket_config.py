@@ -0,0 +1,112 @@
+import os
+import time
+import socket
+
+"""
+* SocketConfig mengumpulkan semua parameter socket yang sebelumnya
+  di-hardcode di server/client (listen backlog, ukuran recv, TCP_NODELAY,
+  SO_SNDBUF/SO_RCVBUF, TCP_CORK)
+
+* nilai default diambil dari environment sehingga server maupun client
+  bisa di-tuning tanpa mengubah kode:
+  FILE_SOCK_BACKLOG, FILE_SOCK_RECV_SIZE, FILE_SOCK_NODELAY,
+  FILE_SOCK_SNDBUF, FILE_SOCK_RCVBUF, FILE_SOCK_CORK
+
+* free_port / wait_for_port dipakai tool yang menjalankan server sendiri
+  di localhost (socket_sweep.py, soak_test.py)
+"""
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def free_port():
+    """A TCP port on localhost that nothing listens on right now"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    """True once a server accepts connections on localhost:port, False after timeout seconds"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+class SocketConfig:
+    def __init__(self, backlog=100, recv_size=1024 * 1024, nodelay=False, sndbuf=0, rcvbuf=0, cork=False):
+        self.backlog = backlog
+        self.recv_size = recv_size
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf  # 0 = leave the OS default
+        self.rcvbuf = rcvbuf
+        self.cork = cork and hasattr(socket, "TCP_CORK")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            backlog=int(os.environ.get("FILE_SOCK_BACKLOG", 100)),
+            recv_size=int(os.environ.get("FILE_SOCK_RECV_SIZE", 1024 * 1024)),
+            nodelay=_env_bool("FILE_SOCK_NODELAY", False),
+            sndbuf=int(os.environ.get("FILE_SOCK_SNDBUF", 0)),
+            rcvbuf=int(os.environ.get("FILE_SOCK_RCVBUF", 0)),
+            cork=_env_bool("FILE_SOCK_CORK", False),
+        )
+
+    def to_env(self):
+        """Environment variables that reproduce this config in another process"""
+        return {
+            "FILE_SOCK_BACKLOG": str(self.backlog),
+            "FILE_SOCK_RECV_SIZE": str(self.recv_size),
+            "FILE_SOCK_NODELAY": "1" if self.nodelay else "0",
+            "FILE_SOCK_SNDBUF": str(self.sndbuf),
+            "FILE_SOCK_RCVBUF": str(self.rcvbuf),
+            "FILE_SOCK_CORK": "1" if self.cork else "0",
+        }
+
+    def as_dict(self):
+        return dict(
+            backlog=self.backlog, recv_size=self.recv_size, nodelay=self.nodelay,
+            sndbuf=self.sndbuf, rcvbuf=self.rcvbuf, cork=self.cork,
+        )
+
+    def apply(self, sock):
+        """Per-connection options, for accepted and client sockets"""
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        return sock
+
+    def listen(self, sock):
+        # buffer sizes set before listen() are inherited by accepted sockets
+        # and taken into account for the TCP window scale
+        self.apply(sock)
+        sock.listen(self.backlog)
+
+    def send_chunks(self, sock, chunks):
+        """sendall() every chunk; with cork the kernel only emits full segments until uncorked"""
+        cork = self.cork and sock.family != socket.AF_UNIX
+        if cork:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        sent = 0
+        try:
+            for chunk in chunks:
+                sock.sendall(chunk)
+                sent += len(chunk)
+        finally:
+            if cork:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+        return sent
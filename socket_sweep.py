@@ -0,0 +1,180 @@
+import os
+import sys
+import csv
+import time
+import base64
+import itertools
+import threading
+import subprocess
+from datetime import datetime
+from file_client_threadpool import FileClient
+from file_storage import storage_from_env
+from socket_config import SocketConfig, free_port, wait_for_port
+
+
+class SocketSweep:
+    """
+    Start file_server_threadpool.py on localhost once per socket setting
+    combination (and server log mode) and measure small-command latency
+    (LIST) and large-transfer throughput (GET), to find the best
+    SocketConfig for each workload. The server's stderr goes to a real file
+    (or a pipe drained by a reader thread), so the log modes are compared
+    including the cost of writing the log.
+    """
+
+    def __init__(self, pool_size=5, list_rounds=200, get_rounds=3, file_size_mb=20, server_log="socket_sweep_server.log"):
+        self.pool_size = pool_size
+        self.server_log = server_log  # file path, or "pipe"
+        self.list_rounds = list_rounds
+        self.get_rounds = get_rounds
+        self.file_size_mb = file_size_mb
+        self.test_file = f"sweep_{file_size_mb}mb.dat"
+        self.results = []
+
+    def prepare_test_file(self):
+        storage = storage_from_env()
+        with storage.open_write(self.test_file) as f:
+            for _ in range(self.file_size_mb):
+                f.write(os.urandom(1024 * 1024))
+        return storage
+
+    @staticmethod
+    def drain(pipe, counter):
+        # stands in for a terminal / log collector reading the server's stderr
+        for chunk in iter(lambda: pipe.read1(64 * 1024), b""):
+            counter[0] += len(chunk)
+
+    def run_single_test(self, config, log_mode="async"):
+        port = free_port()
+        env = dict(os.environ, **config.to_env(), FILE_LOG_MODE=log_mode)
+        log_bytes = [0]
+        if self.server_log == "pipe":
+            stderr = subprocess.PIPE
+        else:
+            stderr = open(self.server_log, "ab")
+            log_start = os.path.getsize(self.server_log)
+        server = subprocess.Popen(
+            [sys.executable, "file_server_threadpool.py", str(self.pool_size), "--port", str(port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=stderr,
+        )
+        if self.server_log == "pipe":
+            drainer = threading.Thread(target=self.drain, args=(server.stderr, log_bytes), daemon=True)
+            drainer.start()
+        try:
+            if not wait_for_port(port):
+                print(f"Server did not start for {config.as_dict()}")
+                return None
+            client = FileClient("127.0.0.1", port, sock_config=config)
+
+            latencies = []
+            for _ in range(self.list_rounds):
+                start = time.perf_counter()
+                result = client.send_command("LIST")
+                if result.get("status") == "OK":
+                    latencies.append(time.perf_counter() - start)
+
+            total_bytes = 0
+            start = time.perf_counter()
+            for _ in range(self.get_rounds):
+                result = client.send_command(f"GET {self.test_file}")
+                if result.get("status") == "OK":
+                    total_bytes += len(base64.b64decode(result["data_file"]))
+            transfer_time = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+            if self.server_log == "pipe":
+                drainer.join()
+                server.stderr.close()
+            else:
+                stderr.close()
+                log_bytes[0] = os.path.getsize(self.server_log) - log_start
+
+        latencies.sort()
+        record = dict(
+            timestamp=datetime.now().isoformat(),
+            **config.as_dict(),
+            log_mode=log_mode,
+            log_bytes=log_bytes[0],
+            list_ok=len(latencies),
+            list_avg_ms=round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            list_p50_ms=round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+            list_p99_ms=round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3) if latencies else None,
+            get_throughput=round(total_bytes / transfer_time / (1024 * 1024), 2) if total_bytes else 0,  # MB/s
+        )
+        self.results.append(record)
+        print(
+            f"nodelay={config.nodelay!s:5} cork={config.cork!s:5} sndbuf/rcvbuf={config.sndbuf:>8} "
+            f"recv={config.recv_size:>8} log={log_mode:5} | LIST p50 {record['list_p50_ms']} ms p99 {record['list_p99_ms']} ms "
+            f"| GET {record['get_throughput']} MB/s"
+        )
+        return record
+
+    def run_sweep(self, nodelay_values, cork_values, buf_values, recv_values, backlog=100, log_modes=("async",)):
+        storage = self.prepare_test_file()
+        try:
+            combos = list(itertools.product(nodelay_values, cork_values, buf_values, recv_values, log_modes))
+            for i, (nodelay, cork, buf, recv_size, log_mode) in enumerate(combos, 1):
+                print(f"\nRunning combination {i}/{len(combos)} ...")
+                config = SocketConfig(
+                    backlog=backlog, recv_size=recv_size, nodelay=nodelay,
+                    sndbuf=buf, rcvbuf=buf, cork=cork,
+                )
+                self.run_single_test(config, log_mode)
+        finally:
+            storage.remove(self.test_file)
+
+    def print_best(self):
+        measured = [r for r in self.results if r["list_p50_ms"] is not None]
+        if not measured:
+            print("No results")
+            return
+        best_latency = min(measured, key=lambda r: r["list_p50_ms"])
+        best_throughput = max(self.results, key=lambda r: r["get_throughput"])
+        keys = ["nodelay", "cork", "sndbuf", "rcvbuf", "recv_size", "log_mode"]
+        print("\nBest small-command latency:")
+        print(f"  {dict((k, best_latency[k]) for k in keys)} -> LIST p50 {best_latency['list_p50_ms']} ms")
+        print("Best large-transfer throughput:")
+        print(f"  {dict((k, best_throughput[k]) for k in keys)} -> GET {best_throughput['get_throughput']} MB/s")
+
+    def save_results_to_csv(self, filename="socket_sweep_results.csv"):
+        if not self.results:
+            print("No results to save")
+            return False
+        try:
+            with open(filename, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=list(self.results[0].keys()))
+                writer.writeheader()
+                writer.writerows(self.results)
+            print(f"\nResults saved to {filename}")
+            return True
+        except Exception as e:
+            print(f"Error saving results: {str(e)}")
+            return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep socket settings against a local thread-pool server")
+    parser.add_argument("--nodelay", nargs="+", type=int, default=[0, 1], help="TCP_NODELAY values to try")
+    parser.add_argument("--cork", nargs="+", type=int, default=[0, 1], help="TCP_CORK values to try")
+    parser.add_argument("--bufsize", nargs="+", type=int, default=[0, 256 * 1024, 4 * 1024 * 1024], help="SO_SNDBUF/SO_RCVBUF sizes (0 = OS default)")
+    parser.add_argument("--recv-size", nargs="+", type=int, default=[64 * 1024, 1024 * 1024], help="recv() sizes to try")
+    parser.add_argument("--log-modes", nargs="+", choices=["async", "sync", "off"], default=["async"], help="Server FILE_LOG_MODE values to try")
+    parser.add_argument("--server-log", default="socket_sweep_server.log",
+                        help="File the server's stderr is appended to, or 'pipe' for a pipe read by this process")
+    parser.add_argument("--pool-size", type=int, default=5, help="Server pool size")
+    parser.add_argument("--list-rounds", type=int, default=200, help="LIST requests per combination")
+    parser.add_argument("--get-rounds", type=int, default=3, help="GET requests per combination")
+    parser.add_argument("--file-size-mb", type=int, default=20, help="Size of the GET test file")
+    parser.add_argument("--output", default="socket_sweep_results.csv", help="Output CSV filename")
+    args = parser.parse_args()
+
+    sweep = SocketSweep(args.pool_size, args.list_rounds, args.get_rounds, args.file_size_mb, args.server_log)
+    sweep.run_sweep(
+        [bool(v) for v in args.nodelay], [bool(v) for v in args.cork], args.bufsize, args.recv_size,
+        log_modes=args.log_modes,
+    )
+    sweep.print_best()
+    sweep.save_results_to_csv(args.output)
@@ -1,15 +1,22 @@
 import os
 import time
 import csv
+import threading
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 from file_client_threadpool import FileClient  # Your existing client class
+import file_client_async
+import workload_trace
 
 class StressTestAutomator:
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, client_mode="thread", control_probe=0, control_workers=0):
         self.server_ip = server_ip
         self.server_port = server_port
+        self.client_mode = client_mode
+        self.control_probe = control_probe  # seconds between LIST probes during a test, 0 = off
+        self.control_workers = control_workers  # server's --control-workers, recorded so runs stay comparable
         self.results = []
+        self.rate_results = []
         self.test_files = {
             'small': 'test_10mb.dat',
             'medium': 'test_50mb.dat',
@@ -27,22 +34,37 @@ class StressTestAutomator:
     def run_single_test(self, operation, filename, client_workers, server_workers):
         """Run a single stress test with specified client/server workers"""
         file_size = os.path.getsize(filename)
-        print(f"\n{operation.upper()} | File: {filename} | Size: {file_size / 1024 / 1024:.2f} MB | Clients: {client_workers} | Server Pool: {server_workers}")
-        
-        client = FileClient(self.server_ip, self.server_port)
+        print(f"\n{operation.upper()} | File: {filename} | Size: {file_size / 1024 / 1024:.2f} MB | Clients: {client_workers} | Server Pool: {server_workers} | Client Mode: {self.client_mode}")
+        if self.control_probe:
+            stop = threading.Event()
+            probe_executor = ThreadPoolExecutor(max_workers=1)
+            probe = probe_executor.submit(self.probe_control_latency, stop, self.control_probe)
 
-        start_time = time.time()
-        with ThreadPoolExecutor(max_workers=client_workers) as executor:
-            futures = []
-            for _ in range(client_workers):
-                if operation == "upload":
-                    futures.append(executor.submit(client.remote_upload, filename))
-                else:
-                    futures.append(executor.submit(client.remote_get, filename))
+        if self.client_mode == "async":
+            async_result = file_client_async.stress_test(
+                self.server_ip, self.server_port, operation, filename, client_workers
+            )
+            results = async_result['results']
+            total_time = async_result['total_time']
+        else:
+            client = FileClient(self.server_ip, self.server_port)
 
-            results = [future.result() for future in futures]
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=client_workers) as executor:
+                futures = []
+                for _ in range(client_workers):
+                    if operation == "upload":
+                        futures.append(executor.submit(client.remote_upload, filename))
+                    else:
+                        futures.append(executor.submit(client.remote_get, filename))
 
-        total_time = time.time() - start_time
+                results = [future.result() for future in futures]
+
+            total_time = time.time() - start_time
+        if self.control_probe:
+            stop.set()
+            control_latencies = sorted(probe.result())
+            probe_executor.shutdown()
         success_count = sum(1 for r in results if r[0])
         fail_count = client_workers - success_count
         total_bytes = sum(r[2] for r in results if r[0])
@@ -56,6 +78,7 @@ class StressTestAutomator:
             'volume': f"{file_size // (1024*1024)} MB",
             'client_workers': client_workers,
             'server_workers': server_workers,
+            'control_workers': self.control_workers,
             'total_time': round(total_time, 2),
             'throughput': round(throughput_mbps, 2),  # MB/s
             'client_success': success_count,
@@ -63,6 +86,10 @@ class StressTestAutomator:
             'server_success': success_count,  # Placeholder, replace with actual server stats if available
             'server_fail': fail_count,     # Placeholder
         }
+        if self.control_probe:
+            result['control_probes'] = len(control_latencies)
+            result['control_p50_ms'] = workload_trace.percentile(control_latencies, 50)
+            result['control_p99_ms'] = workload_trace.percentile(control_latencies, 99)
         self.results.append(result)
         self.print_result_summary(result)
         return result
@@ -73,13 +100,26 @@ class StressTestAutomator:
         print(f"Operation:       {result['operation'].upper()}")
         print(f"File Volume:     {result['volume']}")
         print(f"Client Workers:  {result['client_workers']}")
-        print(f"Server Workers:  {result['server_workers']}")
+        print(f"Server Workers:  {result['server_workers']}" + (f" + {result['control_workers']} control" if result['control_workers'] else ""))
         print(f"Total Time:      {result['total_time']} seconds")
         print(f"Throughput:      {result['throughput']} MB/s")
         print(f"Client Success:  {result['client_success']} / {result['client_workers']}")
         print(f"Client Fail:     {result['client_fail']}")
         print(f"Server Success:  {result['server_success']} / {result['server_success']}")
         print(f"Server Fail:     {result['server_fail']}")
+        if 'control_probes' in result:
+            fmt = lambda v: f"{v:.2f} ms" if v is not None else "-"
+            print(f"Control LIST:    p50 {fmt(result['control_p50_ms'])}, p99 {fmt(result['control_p99_ms'])} ({result['control_probes']} probes)")
+
+    def probe_control_latency(self, stop, interval):
+        """LIST round trips (ms) every `interval` seconds until stop is set, to see whether control commands wait behind transfers"""
+        client = FileClient(self.server_ip, self.server_port)
+        latencies = []
+        while not stop.wait(interval):
+            start = time.time()
+            if client.send_command("LIST").get("status") == "OK":
+                latencies.append((time.time() - start) * 1000)
+        return latencies
     
     def run_full_test_suite(self):
         """Run all test combinations"""
@@ -106,6 +146,82 @@ class StressTestAutomator:
         
         return True
     
+    def run_connection_rate_test(self, connectors, duration=10):
+        """Open connect -> LIST -> close loops from `connectors` threads and measure connections/s"""
+        print(f"\nCONNECTION RATE | Connectors: {connectors} | Duration: {duration}s")
+        client = FileClient(self.server_ip, self.server_port)
+        client.timeout = 10
+        deadline = time.time() + duration
+
+        def loop():
+            ok, fail, latency = 0, 0, 0.0
+            while time.time() < deadline:
+                start = time.time()
+                result = client.send_command("LIST")
+                if result.get("status") == "OK":
+                    ok += 1
+                    latency += time.time() - start
+                else:
+                    fail += 1
+            return ok, fail, latency
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=connectors) as executor:
+            results = list(executor.map(lambda _: loop(), range(connectors)))
+        total_time = time.time() - start_time
+
+        ok = sum(r[0] for r in results)
+        fail = sum(r[1] for r in results)
+        result = {
+            'timestamp': datetime.now().isoformat(),
+            'connectors': connectors,
+            'duration': round(total_time, 2),
+            'connections': ok,
+            'failures': fail,
+            'connections_per_sec': round(ok / total_time, 2) if total_time > 0 else 0,
+            'avg_latency_ms': round(sum(r[2] for r in results) / ok * 1000, 2) if ok else 0,
+        }
+        self.rate_results.append(result)
+        print(f"Connections/s:   {result['connections_per_sec']}")
+        print(f"Connections:     {result['connections']} ok, {result['failures']} failed")
+        print(f"Avg Latency:     {result['avg_latency_ms']} ms")
+        return result
+
+    def run_replay(self, trace_file, speed=1.0, workers=32, output="replay_results.jsonl", baseline=None):
+        """
+        Replay a trace recorded with FILE_RECORD and compare the per-command latency
+        distribution with a baseline (an earlier replay result, or else the trace itself)
+        """
+        records = workload_trace.load(trace_file)
+        print(f"\nREPLAY | Trace: {trace_file} | Requests: {len(records)} | Speed: {speed} | Workers: {workers}")
+        replayer = workload_trace.Replayer(self.server_ip, self.server_port, speed, workers)
+        replayer.prepare(records)
+        results = replayer.run(records)
+        workload_trace.save(results, output)
+        workload_trace.print_summary(workload_trace.latency_summary(results), "Replay latency (client side)")
+        if baseline:
+            workload_trace.compare(workload_trace.load(baseline), results, baseline, output)
+        else:
+            # recorded latencies are measured inside the server, so expect replay to be higher
+            workload_trace.compare(records, results, "recorded", "replay")
+        return results
+
+    def save_rate_results_to_csv(self, filename="connection_rate_results.csv"):
+        """Save connection-rate results to CSV file"""
+        if not self.rate_results:
+            print("No results to save")
+            return False
+        try:
+            with open(filename, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=list(self.rate_results[0].keys()))
+                writer.writeheader()
+                writer.writerows(self.rate_results)
+            print(f"\nResults saved to {filename}")
+            return True
+        except Exception as e:
+            print(f"Error saving results: {str(e)}")
+            return False
+
     def save_results_to_csv(self, filename="stress_test_results.csv"):
         """Save all results to CSV file"""
         if not self.results:
@@ -113,10 +229,12 @@ class StressTestAutomator:
             return False
         
         fieldnames = [
-            'timestamp', 'operation', 'volume', 'client_workers', 'server_workers',
+            'timestamp', 'operation', 'volume', 'client_workers', 'server_workers', 'control_workers',
             'total_time', 'throughput', 'client_success', 'client_fail',
             'server_success', 'server_fail'
         ]
+        if self.control_probe:
+            fieldnames += ['control_probes', 'control_p50_ms', 'control_p99_ms']
         
         try:
             with open(filename, 'w', newline='') as csvfile:
@@ -140,12 +258,34 @@ if __name__ == "__main__":
     parser.add_argument("--file-size", choices=["small", "medium", "large"], help="File size to test")
     parser.add_argument("--client-workers", type=int, help="Number of client worker threads")
     parser.add_argument("--server-workers", type=int, default=1, help="Number of server worker threads (informative)")
+    parser.add_argument("--control-workers", type=int, default=0, help="Server's --control-workers (informative)")
+    parser.add_argument("--client-mode", choices=["thread", "async"], default="thread", help="Thread-per-client or asyncio load generator")
+    parser.add_argument("--connection-rate", action="store_true", help="Measure sustained connections/s instead of transfers")
+    parser.add_argument("--connectors", type=int, nargs="+", default=[1, 10, 50], help="Concurrent connectors for --connection-rate")
+    parser.add_argument("--duration", type=int, default=10, help="Seconds per --connection-rate run")
+    parser.add_argument("--replay", metavar="TRACE", help="Replay a workload trace recorded with FILE_RECORD")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay timing scale (2 = twice as fast, 0 = back to back)")
+    parser.add_argument("--replay-workers", type=int, default=32, help="Max replayed requests in flight")
+    parser.add_argument("--replay-output", default="replay_results.jsonl", help="Per-request replay results")
+    parser.add_argument("--compare", metavar="RESULTS", help="Earlier replay results to compare latencies against")
+    parser.add_argument("--control-probe", type=float, default=0, metavar="SECONDS",
+                        help="Send a LIST every SECONDS during each test and report its latency")
     parser.add_argument("--output", default="stress_test_results.csv", help="Output CSV filename")
     
     args = parser.parse_args()
     
-    automator = StressTestAutomator(args.server_ip, args.server_port)
+    automator = StressTestAutomator(args.server_ip, args.server_port, args.client_mode, args.control_probe, args.control_workers)
+
+    if args.replay:
+        automator.run_replay(args.replay, args.speed, args.replay_workers, args.replay_output, args.compare)
+        exit(0)
     
+    if args.connection_rate:
+        for connectors in args.connectors:
+            automator.run_connection_rate_test(connectors, args.duration)
+        automator.save_rate_results_to_csv(args.output)
+        exit(0)
+
     if args.single_test:
         if not all([args.operation, args.file_size, args.client_workers]):
             print("Error: --operation, --file-size, and --client-workers required for single test")
@@ -3,11 +3,13 @@ import time
 import csv
 from datetime import datetime
 from file_client_processpool import stress_test
+import file_client_async
 
 class StressTestAutomatorProcessPool:
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, client_mode="process"):
         self.server_ip = server_ip
         self.server_port = server_port
+        self.client_mode = client_mode
         self.results = []
         self.test_files = {
             'small': 'test_10mb.dat',
@@ -26,10 +28,11 @@ class StressTestAutomatorProcessPool:
     def run_single_test(self, operation, filename, client_workers):
         """Run a single stress test using ProcessPoolExecutor"""
         file_size = os.path.getsize(filename)
-        print(f"\n{operation.upper()} | File: {filename} | Size: {file_size / 1024 / 1024:.2f} MB | Workers: {client_workers}")
+        print(f"\n{operation.upper()} | File: {filename} | Size: {file_size / 1024 / 1024:.2f} MB | Workers: {client_workers} | Client Mode: {self.client_mode}")
 
         # execute stress test
-        result = stress_test(
+        run = file_client_async.stress_test if self.client_mode == "async" else stress_test
+        result = run(
             self.server_ip,
             self.server_port,
             operation,
@@ -122,10 +125,11 @@ if __name__ == "__main__":
     parser.add_argument("--operation", choices=["upload", "download"], help="Operation to test")
     parser.add_argument("--file-size", choices=["small", "medium", "large"], help="File size to test")
     parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--client-mode", choices=["process", "async"], default="process", help="Process-per-client or asyncio load generator")
     parser.add_argument("--output", default="stress_test_results_processpool.csv", help="Output CSV filename")
     args = parser.parse_args()
 
-    automator = StressTestAutomatorProcessPool(args.server_ip, args.server_port)
+    automator = StressTestAutomatorProcessPool(args.server_ip, args.server_port, args.client_mode)
 
     if args.single_test:
         if not all([args.operation, args.file_size, args.workers]):
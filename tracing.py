@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import glob
+import time
+import uuid
+import atexit
+import threading
+import contextvars
+
+"""
+* tracing per request dalam format Chrome trace-event, aktif jika
+  FILE_TRACE berisi direktori tujuan:
+  FILE_TRACE=traces python3 file_server_threadpool.py 5
+
+* tiap proses menulis trace-<program>-<pid>.json sendiri (format JSON
+  array, boleh tanpa penutup sehingga tetap terbaca walau proses dibunuh);
+  gabungkan dengan: python3 tracing.py merge traces -o trace.json
+  lalu buka di chrome://tracing atau ui.perfetto.dev
+
+* trace id dikirim client di depan command:
+  @trace:<id> GET namafile
+  server membuang prefix ini sebelum memproses command
+"""
+
+TRACE_PREFIX = "@trace:"
+
+_context = contextvars.ContextVar("trace_context", default={})
+
+
+def split_trace(command):
+    """Split an optional '@trace:<id> ' prefix off a command (str or bytes)"""
+    text = isinstance(command, str)
+    prefix = TRACE_PREFIX if text else TRACE_PREFIX.encode()
+    if not command.startswith(prefix):
+        return None, command
+    head, _, rest = command.partition(" " if text else b" ")
+    trace_id = head[len(prefix):]
+    return (trace_id if text else trace_id.decode(errors="replace")), rest
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, args, context=None, flow_end=False):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.context = context
+        self.flow_end = flow_end
+        self.token = None
+
+    def __enter__(self):
+        if self.context is not None:
+            self.token = _context.set(self.context)
+        self.ts = time.time_ns() / 1000
+        self.start = time.perf_counter_ns()
+        if self.flow_end:
+            # must fall inside this slice for the arrow to bind to it
+            self.tracer.flow("f", self.context["trace_id"], self.ts + 0.001)
+        return self.context.get("trace_id") if self.context is not None else None
+
+    def __exit__(self, *exc):
+        dur = (time.perf_counter_ns() - self.start) / 1000
+        self.tracer.complete(self.name, self.ts, dur, self.args)
+        if self.token is not None:
+            _context.reset(self.token)
+            # a finished request is a good moment to make its events durable
+            self.tracer.flush()
+        return False
+
+
+class Tracer:
+    """
+    Records timestamped spans ("X" events) with the current trace id,
+    connection and worker attached. A request span links the client and
+    server sides with a flow arrow that shares the trace id.
+    """
+
+    def __init__(self, directory=None, name="trace"):
+        self.directory = directory
+        self.enabled = bool(directory)
+        self.name = name
+        self.lock = threading.Lock()
+        self.fd = None
+        self.out_pid = None
+        self.pending = []
+        self.named_threads = set()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # the parent's unwritten events and lock state stay with the parent
+        self.lock = threading.Lock()
+        self.fd = None
+        self.out_pid = None
+        self.pending = []
+
+    @classmethod
+    def from_env(cls):
+        program = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        return cls(os.environ.get("FILE_TRACE"), program)
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex[:16]
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def request(self, command=None, trace_id=None, flow=True, **args):
+        """
+        Top-level span of one request, named after the command verb; nested
+        spans carry its trace id. Without a trace_id a new one is created
+        (client side); a trace_id received from a client ends the flow
+        arrow started by that client, unless flow is False (work handed
+        on to another process for a request whose arrow already ended).
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        name = "request"
+        if command:
+            # only the head is looked at so an UPLOAD payload isn't copied
+            head = command[:16] if isinstance(command, str) else command[:16].decode(errors="replace")
+            name = head.split(" ", 1)[0].upper()
+        context = dict(_context.get(), worker=threading.current_thread().name)
+        context.update(args)
+        context["trace_id"] = trace_id or self.new_id()
+        return _Span(self, name, {}, context, flow_end=flow and trace_id is not None)
+
+    def frame(self, command):
+        """Prefix command (str or bytes) with the current trace id so the server continues the trace"""
+        trace_id = _context.get().get("trace_id") if self.enabled else None
+        if trace_id is None:
+            return command
+        self.flow("s", trace_id)
+        prefix = f"{TRACE_PREFIX}{trace_id} "
+        return prefix + command if isinstance(command, str) else prefix.encode() + command
+
+    def send_spans(self, chunks, name="send"):
+        """Wrap a chunk generator; time spent by the consumer between chunks becomes a send span"""
+        if not self.enabled:
+            yield from chunks
+            return
+        for chunk in chunks:
+            ts = time.time_ns() / 1000
+            start = time.perf_counter_ns()
+            yield chunk
+            self.complete(name, ts, (time.perf_counter_ns() - start) / 1000, dict(bytes=len(chunk)))
+
+    def flow(self, phase, trace_id, ts=None):
+        event = dict(name="request", cat="flow", ph=phase, id=trace_id, ts=ts or time.time_ns() / 1000)
+        if phase == "f":
+            event["bp"] = "e"
+        self.emit(event)
+
+    def complete(self, name, ts, dur, args):
+        context = _context.get()
+        self.emit(dict(name=name, cat=self.name, ph="X", ts=ts, dur=dur, args=dict(context, **args)))
+
+    def emit(self, event):
+        pid = os.getpid()
+        context = _context.get()
+        # async clients run many requests on one thread; give each its own row
+        tid = context.get("tid", threading.get_ident())
+        event.update(pid=pid, tid=tid)
+        line = json.dumps(event)
+        with self.lock:
+            if self.out_pid != pid:
+                self._open(pid)
+            if tid not in self.named_threads:
+                self.named_threads.add(tid)
+                thread_name = context.get("worker") if "tid" in context else threading.current_thread().name
+                self.pending.append(json.dumps(dict(name="thread_name", ph="M", pid=pid, tid=tid, args=dict(name=thread_name))) + ",\n")
+            self.pending.append(line + ",\n")
+            if len(self.pending) >= 1000:
+                self._write()
+
+    def _open(self, pid):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"trace-{self.name}-{pid}.json")
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.out_pid = pid
+        self.named_threads = set()
+        self.pending = ["[\n", json.dumps(dict(name="process_name", ph="M", pid=pid, tid=0, args=dict(name=f"{self.name} {pid}"))) + ",\n"]
+
+    def _write(self):
+        data = "".join(self.pending).encode()
+        self.pending = []
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def flush(self):
+        with self.lock:
+            if self.fd is not None and self.pending:
+                self._write()
+
+
+tracer = Tracer.from_env()
+atexit.register(tracer.flush)
+
+
+def load_events(path):
+    with open(path) as f:
+        text = f.read().rstrip()
+    if not text.endswith("]"):
+        text = text.rstrip(",") + "]"
+    return json.loads(text)
+
+
+def merge(directory, output):
+    events = []
+    for path in sorted(glob.glob(os.path.join(directory, "trace-*.json"))):
+        try:
+            events.extend(load_events(path))
+        except ValueError as e:
+            print(f"Skipping {path}: {e}")
+    with open(output, "w") as f:
+        json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+    return events
+
+
+def summarize(events):
+    """Total and average duration per phase name"""
+    phases = {}
+    for e in events:
+        if e.get("ph") == "X":
+            count, total = phases.get((e["cat"], e["name"]), (0, 0.0))
+            phases[(e["cat"], e["name"])] = (count + 1, total + e["dur"])
+    print(f"{'process':<28} {'phase':<10} {'count':>8} {'total ms':>12} {'avg ms':>10}")
+    for (cat, name), (count, total) in sorted(phases.items()):
+        print(f"{cat:<28} {name:<10} {count:>8} {total / 1000:>12.2f} {total / count / 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge per-process trace files into one Chrome trace")
+    sub = parser.add_subparsers(dest="action", required=True)
+    merge_parser = sub.add_parser("merge")
+    merge_parser.add_argument("directory", help="FILE_TRACE directory")
+    merge_parser.add_argument("-o", "--output", default="trace.json")
+    args = parser.parse_args()
+
+    events = merge(args.directory, args.output)
+    print(f"{len(events)} events written to {args.output}")
+    summarize(events)
@@ -0,0 +1,297 @@
+import os
+import json
+import math
+import time
+import base64
+import hashlib
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+* rekam trace workload di server: FILE_RECORD=<file.jsonl> python3 file_server_threadpool.py 5
+  setiap request menjadi satu baris JSON:
+  {"ts": epoch, "cmd": "GET", "file": "<hash>.jpg", "size": bytes, "latency_ms": ..., "resp_bytes": ..., "ok": true}
+  nama file dianonimkan (hash dengan salt acak per proses, ekstensi dipertahankan)
+
+* replay trace ke server mana pun dengan timing asli atau diskalakan:
+  python3 workload_trace.py replay trace.jsonl --server 127.0.0.1:6667 --speed 2
+  file yang dibaca trace dibuat dulu (isi acak, ukuran sesuai trace)
+
+* bandingkan distribusi latency per command antara dua run (trace atau hasil replay):
+  python3 workload_trace.py compare before.jsonl after.jsonl
+"""
+
+# only this much of a command is parsed, so an UPLOAD payload is never copied
+HEAD_LEN = 512
+FILE_COMMANDS = ("GET", "GETIF", "UPLOAD", "DELETE")
+WRITE_COMMANDS = ("UPLOAD", "DELETE")
+
+
+def parse_head(command):
+    head = command[:HEAD_LEN]
+    if isinstance(head, bytes):
+        head = head.decode(errors="replace")
+    parts = head.split(" ", 2)
+    verb = parts[0].strip().upper()
+    name = parts[1] if len(parts) > 1 and verb in FILE_COMMANDS else ""
+    payload = len(command) - len(parts[0]) - len(name) - 2 if verb == "UPLOAD" and len(parts) > 2 else 0
+    return verb, name, payload
+
+
+class TraceRecorder:
+    def __init__(self, path=None, salt=None):
+        self.path = path
+        self.enabled = bool(path)
+        self.salt = salt if salt is not None else os.urandom(16)
+        self.fd = None
+        self.fd_pid = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        salt = os.environ.get("FILE_RECORD_SALT")
+        return cls(os.environ.get("FILE_RECORD"), salt.encode() if salt else None)
+
+    def anonymise(self, name):
+        if not name:
+            return ""
+        ext = os.path.splitext(name)[1]
+        return hashlib.sha256(self.salt + name.encode()).hexdigest()[:16] + ext
+
+    def describe(self, command, storage=None):
+        """(cmd, anonymised file, file size) of a raw command"""
+        verb, name, payload = parse_head(command)
+        size = 0
+        if verb == "UPLOAD":
+            # decoded byte count: every 4 base64 characters are 3 bytes, minus the padding
+            tail = command[-2:]
+            padding = (tail.decode(errors="replace") if isinstance(tail, bytes) else tail).count("=")
+            size = max(0, payload * 3 // 4 - padding)
+        if verb in ("GET", "GETIF") and storage is not None:
+            try:
+                size = storage.stat(name).st_size
+            except OSError:
+                pass
+        return verb, self.anonymise(name), size
+
+    def record(self, command, started, resp_bytes, ok, storage=None):
+        self.write(self.describe(command, storage), started, resp_bytes, ok)
+
+    def write(self, request, started, resp_bytes, ok):
+        verb, name, size = request
+        line = json.dumps(dict(
+            ts=round(started, 6), cmd=verb, file=name, size=size,
+            latency_ms=round((time.time() - started) * 1000, 3), resp_bytes=resp_bytes, ok=ok,
+        )) + "\n"
+        with self.lock:
+            if self.fd_pid != os.getpid():
+                # forked workers open their own descriptor; O_APPEND keeps lines whole
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self.fd_pid = os.getpid()
+            os.write(self.fd, line.encode())
+
+    def stream(self, command, chunks, storage=None):
+        """Pass chunks through; the request is recorded once the last one has been sent"""
+        started = time.time()
+        sent = 0
+        ok = None
+        for chunk in chunks:
+            if ok is None:
+                ok = chunk.startswith((b'{"status": "OK"', b'{"status": "NOT_MODIFIED"'))
+            sent += len(chunk)
+            yield chunk
+        self.record(command, started, sent, bool(ok), storage)
+
+
+recorder = TraceRecorder.from_env()
+
+
+def load(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest rank
+    k = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def latency_summary(records):
+    """Per-command count, failures and p50/p90/p99/max latency in ms"""
+    by_cmd = {}
+    for r in records:
+        by_cmd.setdefault(r["cmd"], []).append(r)
+    summary = {}
+    for cmd, rows in sorted(by_cmd.items()):
+        latencies = sorted(r["latency_ms"] for r in rows if r["ok"])
+        summary[cmd] = dict(
+            count=len(rows),
+            failed=sum(1 for r in rows if not r["ok"]),
+            p50=percentile(latencies, 50),
+            p90=percentile(latencies, 90),
+            p99=percentile(latencies, 99),
+            max=latencies[-1] if latencies else None,
+        )
+    return summary
+
+
+def print_summary(summary, title):
+    print(f"\n{title}")
+    print(f"{'cmd':<10} {'count':>7} {'failed':>7} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for cmd, s in summary.items():
+        cells = " ".join(f"{s[k]:>10.2f}" if s[k] is not None else f"{'-':>10}" for k in ("p50", "p90", "p99", "max"))
+        print(f"{cmd:<10} {s['count']:>7} {s['failed']:>7} {cells}")
+
+
+def compare(baseline, candidate, baseline_name="baseline", candidate_name="candidate"):
+    """Print both latency distributions per command side by side with the relative change"""
+    a, b = latency_summary(baseline), latency_summary(candidate)
+    print(f"\n{'cmd':<10} {'pct':<4} {baseline_name[:14]:>14} {candidate_name[:14]:>14} {'change':>9}")
+    for cmd in sorted(set(a) | set(b)):
+        for key in ("p50", "p90", "p99"):
+            before = a.get(cmd, {}).get(key)
+            after = b.get(cmd, {}).get(key)
+            change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else "-"
+            fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+            print(f"{cmd:<10} {key:<4} {fmt(before):>14} {fmt(after):>14} {change:>9}")
+    return a, b
+
+
+@lru_cache(maxsize=16)
+def payload(size):
+    return base64.b64encode(os.urandom(size)).decode()
+
+
+class Replayer:
+    """
+    Re-issue the requests of a trace against a server. speed scales the
+    original gaps between requests (2 = twice as fast, 0 = no waiting).
+    Latency is measured per request from the moment it is sent; lag_ms is
+    how late it was sent compared to the schedule.
+
+    Requests on the same file keep the trace order around writes: an
+    UPLOAD/DELETE waits for the earlier requests on that file, and later
+    requests wait for it. Reads of the same file still overlap, so even
+    speed 0 can't make a GET race the UPLOAD it depends on.
+    """
+
+    def __init__(self, server_ip, server_port, speed=1.0, workers=32):
+        # imported here: servers import this module for the recorder only
+        from file_client_threadpool import FileClient
+        self.client = FileClient(server_ip, server_port)
+        self.speed = speed
+        self.workers = workers
+
+    def prepare(self, records):
+        """Create every file that the trace reads before (or without) uploading it"""
+        uploaded = set()
+        needed = {}
+        for r in records:
+            if r["cmd"] == "UPLOAD":
+                uploaded.add(r["file"])
+            elif r["file"] and r["ok"] and r["file"] not in uploaded:
+                needed[r["file"]] = max(needed.get(r["file"], 0), r.get("size") or 0)
+        for name, size in needed.items():
+            self.client.send_command(f"UPLOAD {name} {self.body(size)}")
+        print(f"Prepared {len(needed)} file(s) for replay")
+        return needed
+
+    @staticmethod
+    def body(size):
+        # large bodies aren't cached so a trace full of big uploads doesn't pin memory
+        return payload(size) if size <= 8 * 1024 * 1024 else base64.b64encode(os.urandom(size)).decode()
+
+    def command(self, r):
+        if r["cmd"] == "UPLOAD":
+            return f"UPLOAD {r['file']} {self.body(r.get('size') or 0)}"
+        if r["file"]:
+            return f"{r['cmd']} {r['file']}"
+        return r["cmd"]
+
+    def issue(self, r, scheduled, after=()):
+        for earlier in after:
+            earlier.result()
+        started = time.time()
+        result = self.client.send_command(self.command(r))
+        return dict(
+            ts=round(started, 6), cmd=r["cmd"], file=r["file"], size=r.get("size", 0),
+            latency_ms=round((time.time() - started) * 1000, 3),
+            lag_ms=round(max(0.0, started - scheduled) * 1000, 3),
+            ok=result.get("status") in ("OK", "NOT_MODIFIED"),
+        )
+
+    def run(self, records):
+        if not records:
+            return []
+        t0 = records[0]["ts"]
+        start = time.time()
+        futures = []
+        last_write = {}   # file -> future of its latest UPLOAD/DELETE
+        reads = {}        # file -> futures of the requests issued since then
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for r in records:
+                scheduled = start + ((r["ts"] - t0) / self.speed if self.speed > 0 else 0)
+                delay = scheduled - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                name = r["file"]
+                # only ever waits on earlier submissions, which the pool has already started
+                after = [last_write[name]] if name in last_write else []
+                if r["cmd"] in WRITE_COMMANDS:
+                    after += reads.pop(name, [])
+                future = executor.submit(self.issue, r, scheduled, after if name else ())
+                if name and r["cmd"] in WRITE_COMMANDS:
+                    last_write[name] = future
+                elif name:
+                    reads.setdefault(name, []).append(future)
+                futures.append(future)
+            results = [f.result() for f in futures]
+        elapsed = time.time() - start
+        original = records[-1]["ts"] - t0
+        print(f"Replayed {len(results)} request(s) in {elapsed:.2f} s (trace span {original:.2f} s, speed {self.speed})")
+        return results
+
+
+def save(records, path):
+    with open(path, "w") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay and compare recorded file server workloads")
+    sub = parser.add_subparsers(dest="action", required=True)
+    replay = sub.add_parser("replay", help="Replay a trace against a server")
+    replay.add_argument("trace")
+    replay.add_argument("--server", default="127.0.0.1:6667", help="host:port")
+    replay.add_argument("--speed", type=float, default=1.0, help="Timing scale (2 = twice as fast, 0 = back to back)")
+    replay.add_argument("--workers", type=int, default=32, help="Max requests in flight")
+    replay.add_argument("--limit", type=int, help="Only replay the first N requests")
+    replay.add_argument("--output", default="replay_results.jsonl")
+    summary = sub.add_parser("summary", help="Latency distribution of a trace or replay result")
+    summary.add_argument("file")
+    diff = sub.add_parser("compare", help="Compare two traces / replay results")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    args = parser.parse_args()
+
+    if args.action == "replay":
+        host, _, port = args.server.rpartition(":")
+        records = load(args.trace)[:args.limit]
+        replayer = Replayer(host, int(port), args.speed, args.workers)
+        replayer.prepare(records)
+        results = replayer.run(records)
+        save(results, args.output)
+        print_summary(latency_summary(results), f"Replay of {args.trace}")
+    elif args.action == "summary":
+        print_summary(latency_summary(load(args.file)), args.file)
+    else:
+        compare(load(args.baseline), load(args.candidate), args.baseline, args.candidate)